@@ -0,0 +1,93 @@
+import argparse
+import asyncio
+import os
+import random
+import time
+from typing import List
+
+import httpx
+
+
+AI_API_BASE = os.getenv("AI_API_BASE", "http://localhost:8003/api/ai")
+
+# Questions the offline LLM (LLM_PROVIDER=fake) has canned SQL for
+DEFAULT_QUESTIONS = [
+    "Which device uses the most energy?",
+    "What was the energy usage of my devices in the last week?",
+    "Show the hourly trend of my power usage today",
+    "How many readings does each device have?",
+]
+
+# Stage latencies recorded by ai-service, in pipeline order
+STAGES = [
+    "telemetry GET /devices/details",
+    "llm sql_generation",
+    "telemetry POST /query",
+    "llm final_response",
+]
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Drive /api/ai/query at a fixed concurrency and report end-to-end and per-stage latency."
+    )
+    parser.add_argument("--token", default=os.getenv("TELEMETRY_TOKEN"),
+                        help="JWT of a user with seeded devices (see telemetry-service/initialize_data.py)")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--question", action="append", help="Question to ask (repeatable); defaults to canned questions")
+    args = parser.parse_args()
+
+    if not args.token:
+        parser.error("A JWT is required via --token or TELEMETRY_TOKEN.")
+    questions = args.question or DEFAULT_QUESTIONS
+    headers = {"Authorization": f"Bearer {args.token}"}
+    latencies: List[float] = []
+    errors = 0
+    remaining = args.requests
+
+    async with httpx.AsyncClient(base_url=AI_API_BASE, headers=headers, timeout=120.0) as client:
+
+        async def worker():
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                started = time.perf_counter()
+                try:
+                    resp = await client.post("/query", params={"user_query": random.choice(questions)})
+                    if resp.status_code >= 300:
+                        errors += 1
+                        print(f"  {resp.status_code}: {resp.text[:200]}")
+                except httpx.HTTPError as e:
+                    errors += 1
+                    print(f"  request failed: {e}")
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+        stage_metrics = (await client.get("/metrics")).json()
+
+    print(f"{len(latencies)} requests, concurrency {args.concurrency}, {elapsed:.1f}s, "
+          f"{len(latencies) / elapsed:.1f} req/s, {errors} errors")
+    print(f"{'stage':<32} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for stage in STAGES:
+        m = stage_metrics["latency"].get(stage)
+        if m:
+            print(f"{stage:<32} {m['count']:>7} {m['p50_ms']:>9.1f} {m['p95_ms']:>9.1f} {m['p99_ms']:>9.1f}")
+    print(f"{'end to end (client)':<32} {len(latencies):>7} {percentile(latencies, 50):>9.1f} "
+          f"{percentile(latencies, 95):>9.1f} {percentile(latencies, 99):>9.1f}")
+    hit_rate = stage_metrics.get("sql_cache_hit_rate", 0.0)
+    print(f"SQL cache hit rate: {hit_rate:.0%} (set SQL_CACHE_MAX_ENTRIES=0 to measure uncached SQL generation)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
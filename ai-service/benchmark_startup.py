@@ -0,0 +1,72 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+
+# Libraries that take seconds to import and must only load lazily (see query_helper.load_litellm)
+LAZY_MODULES = ["litellm", "openai", "tiktoken", "tokenizers"]
+
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def measure_imports(module: str) -> List[Tuple[str, int, int]]:
+    """Import `module` in a fresh interpreter and return (name, cumulative_us, depth) per imported module."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    imports = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            imports.append((match.group(4), int(match.group(2)), len(match.group(3)) // 2))
+    return imports
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check ai-service's cold-start import time against a budget, using python -X importtime."
+    )
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_TIME_BUDGET_MS", "1500")))
+    parser.add_argument("--runs", type=int, default=3, help="Best of N runs, to smooth out disk cache effects")
+    parser.add_argument("--top", type=int, default=10, help="Heaviest top-level imports to list")
+    args = parser.parse_args()
+
+    best_ms = None
+    best_imports: List[Tuple[str, int, int]] = []
+    for _ in range(args.runs):
+        imports = measure_imports(args.module)
+        total_ms = next(us for name, us, _ in imports if name == args.module) / 1000
+        if best_ms is None or total_ms < best_ms:
+            best_ms, best_imports = total_ms, imports
+
+    # Direct dependencies of the measured module, heaviest first
+    top_level: Dict[str, int] = {name: us for name, us, depth in best_imports if depth == 1}
+    print(f"import {args.module}: {best_ms:.0f} ms (best of {args.runs}), budget {args.budget_ms:.0f} ms")
+    for name, us in sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {name:<32} {us / 1000:>8.1f} ms")
+
+    failures = []
+    if best_ms > args.budget_ms:
+        failures.append(f"import time {best_ms:.0f} ms exceeds the {args.budget_ms:.0f} ms budget")
+    imported = {name.split(".")[0] for name, _, _ in best_imports}
+    for module in LAZY_MODULES:
+        if module in imported:
+            failures.append(f"{module} is imported at startup; it should be loaded lazily")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# Scripted, deterministic stand-in for the LLM, for local performance testing without network access.
+# Enabled with LLM_PROVIDER=fake. Mimics the parts of litellm's acompletion response used by query_helper.
+import asyncio
+import json
+import os
+import re
+from types import SimpleNamespace
+
+# Simulated time to first token, and delay between streamed tokens
+FAKE_LLM_LATENCY_MS = float(os.environ.get("FAKE_LLM_LATENCY_MS", "300"))
+FAKE_LLM_TOKEN_DELAY_MS = float(os.environ.get("FAKE_LLM_TOKEN_DELAY_MS", "20"))
+
+# Canned questions (matched by keyword) -> SQL template. {devices} is the quoted alias list from the prompt.
+CANNED_QUERIES = [
+    (
+        r"\b(most|highest|biggest|top)\b",
+        "SELECT device_id, AVG(energy_watts) AS avg_watts FROM telemetry WHERE device_id IN ({devices}) "
+        "AND timestamp > now() - INTERVAL '7 days' GROUP BY device_id ORDER BY avg_watts DESC LIMIT 1",
+    ),
+    (
+        r"\b(hour|hourly|trend|over time)\b",
+        "SELECT time_bucket('1 hour', timestamp) AS bucket, device_id, AVG(energy_watts) AS avg_watts "
+        "FROM telemetry WHERE device_id IN ({devices}) AND timestamp > now() - INTERVAL '1 day' "
+        "GROUP BY bucket, device_id ORDER BY bucket LIMIT 500",
+    ),
+    (
+        r"\b(week|usage|energy|consum)",
+        "SELECT device_id, (AVG(energy_watts) * (EXTRACT(epoch FROM (MAX(timestamp) - MIN(timestamp))) / 3600)) / 1000 "
+        "AS total_kwh FROM telemetry WHERE device_id IN ({devices}) AND timestamp > now() - INTERVAL '7 days' "
+        "GROUP BY device_id",
+    ),
+]
+DEFAULT_QUERY = (
+    "SELECT device_id, COUNT(*) AS readings, AVG(energy_watts) AS avg_watts FROM telemetry "
+    "WHERE device_id IN ({devices}) GROUP BY device_id"
+)
+
+
+def _usage(messages, content: str):
+    prompt_words = sum(len(m["content"].split()) for m in messages)
+    return SimpleNamespace(prompt_tokens=prompt_words * 4 // 3, completion_tokens=len(content.split()) * 4 // 3)
+
+
+def _response(content: str, usage):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=usage,
+    )
+
+
+def _chunk(content: str, usage=None):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))], usage=usage)
+
+
+def _generate_sql(system_prompt: str, question: str) -> str:
+    # Devices are listed in the prompt catalog as aliases, e.g. "Smart Fan: d1=Fan - 1" or "d1..d40"
+    catalog = system_prompt.rsplit("Below are the devices", 1)[-1]
+    aliases = []
+    for first, last in re.findall(r"\bd(\d+)\.\.d(\d+)\b", catalog):
+        aliases.extend(f"d{i}" for i in range(int(first), int(last) + 1))
+    aliases.extend(a for a in re.findall(r"\b(d\d+)=", catalog) if a not in aliases)
+    devices = ",".join(f"'{alias}'" for alias in aliases) or "NULL"
+
+    question = question.lower()
+    template = next((sql for pattern, sql in CANNED_QUERIES if re.search(pattern, question)), DEFAULT_QUERY)
+    return template.format(devices=devices)
+
+
+def _generate_answer(prompt: str) -> str:
+    rows = re.search(r"Rows: (\d+)", prompt)
+    result = prompt.split("SQL Result:", 1)[-1].strip().splitlines()
+    row_count = int(rows.group(1)) if rows else max(len(result) - 1, 0)
+    return (
+        f"Based on {row_count} result rows, here is a summary of your energy usage. "
+        f"{' '.join(result[:3])}"
+    )
+
+
+async def _stream(content: str, usage):
+    for token in re.findall(r"\S+\s*", content):
+        await asyncio.sleep(FAKE_LLM_TOKEN_DELAY_MS / 1000)
+        yield _chunk(token)
+    yield SimpleNamespace(choices=[], usage=usage)
+
+
+async def acompletion(model, messages, stream=False, response_format=None, **kwargs):
+    """Deterministic replacement for litellm.acompletion."""
+    await asyncio.sleep(FAKE_LLM_LATENCY_MS / 1000)
+
+    if response_format and response_format.get("type") == "json_object":
+        system_prompt = next((m["content"] for m in messages if m["role"] == "system"), "")
+        question = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        content = json.dumps({"query": _generate_sql(system_prompt, question)})
+    else:
+        content = _generate_answer(messages[-1]["content"])
+
+    usage = _usage(messages, content)
+    if stream:
+        return _stream(content, usage)
+    # Non-streaming responses still take as long as the tokens would to generate
+    await asyncio.sleep(FAKE_LLM_TOKEN_DELAY_MS / 1000 * len(content.split()))
+    return _response(content, usage)
@@ -1,13 +1,26 @@
 import os
-from fastapi import FastAPI, Depends, HTTPException, APIRouter, Body
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, HTTPException, APIRouter, Body, Request
 from typing import Annotated, List
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPBearer
 from dotenv import load_dotenv
 
-from models import QueryResponse
+from models import QueryResponse, BatchQueryRequest, BatchQueryAnswer, BatchQueryResponse
 import httpx
-from query_helper import get_system_prompt, get_sql_query, generate_final_response, get_llm_model_and_api_key
+from query_helper import (
+    load_litellm, get_system_prompt, resolve_device_aliases, get_sql_query, generate_final_response, stream_final_response, get_llm_model_and_api_key
+)
+from telemetry_client import TelemetryClient, CircuitOpenError
+from metrics import metrics
+from tracing import start_trace, use_trace, span
+from sql_cache import SQLQueryCache
+from security import decode_user_id
+from rate_limit import create_rate_limiter, too_many_requests, LoadMonitor, PRIORITY_ANALYTICS, SHED_RETRY_AFTER_SECONDS
 
 load_dotenv()
 
@@ -19,7 +32,51 @@ if os.getenv("ENABLE_DEBUGPY") == "true":
 
 TELEMETRY_SERVICE_URL = os.getenv("TELEMETRY_SERVICE_URL", "http://telemetry-service:8002/api/telemetry")
 
-app = FastAPI(title="AI Service API")
+RATE_LIMIT_AI_QUERY_PER_MINUTE = float(os.getenv("RATE_LIMIT_AI_QUERY_PER_MINUTE", "10"))
+RATE_LIMIT_AI_QUERY_BURST = float(os.getenv("RATE_LIMIT_AI_QUERY_BURST", "5"))
+
+# Batch endpoint: questions per batch, and LLM calls in flight at once per batch
+AI_BATCH_MAX_QUESTIONS = int(os.getenv("AI_BATCH_MAX_QUESTIONS", "20"))
+# Batched questions per user, in their own bucket sized for one full batch (e.g. a nightly report)
+RATE_LIMIT_AI_BATCH_PER_MINUTE = float(os.getenv("RATE_LIMIT_AI_BATCH_PER_MINUTE", "2"))
+RATE_LIMIT_AI_BATCH_BURST = float(os.getenv("RATE_LIMIT_AI_BATCH_BURST", "20"))
+AI_BATCH_CONCURRENCY = int(os.getenv("AI_BATCH_CONCURRENCY", "5"))
+
+rate_limiter = create_rate_limiter(os.getenv("RATE_LIMIT_REDIS_URL"))
+# In-memory buckets aren't shared, so each worker would allow a caller the full rate
+if int(os.getenv("WEB_CONCURRENCY", "1")) > 1 and not os.getenv("RATE_LIMIT_REDIS_URL"):
+    raise RuntimeError("Running more than one worker (WEB_CONCURRENCY) requires RATE_LIMIT_REDIS_URL.")
+load_monitor = LoadMonitor(max_loop_lag_ms=float(os.getenv("SHED_MAX_LOOP_LAG_MS", "200")))
+sql_cache = SQLQueryCache(
+    max_entries=int(os.getenv("SQL_CACHE_MAX_ENTRIES", "10000")),
+    ttl_seconds=float(os.getenv("SQL_CACHE_TTL_SECONDS", "86400")),
+    embedding_model=os.getenv("SQL_CACHE_EMBEDDING_MODEL") or None,
+    similarity_threshold=float(os.getenv("SQL_CACHE_SIMILARITY_THRESHOLD", "0.95")),
+)
+telemetry_client = TelemetryClient(
+    TELEMETRY_SERVICE_URL,
+    max_retries=int(os.getenv("TELEMETRY_MAX_RETRIES", "2")),
+    connect_timeout=float(os.getenv("TELEMETRY_CONNECT_TIMEOUT", "3")),
+    read_timeout=float(os.getenv("TELEMETRY_READ_TIMEOUT", "30")),
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    load_monitor_task = asyncio.create_task(load_monitor.run())
+    await telemetry_client.start()
+    # Load the LLM client in the background so health checks are served right away
+    warm_up_task = None
+    if os.getenv("LLM_PROVIDER") != "fake":
+        warm_up_task = asyncio.create_task(load_litellm())
+    yield
+    load_monitor_task.cancel()
+    if warm_up_task is not None:
+        warm_up_task.cancel()
+    await telemetry_client.close()
+
+
+app = FastAPI(lifespan=lifespan, title="AI Service API", default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -36,6 +93,24 @@ router = APIRouter(prefix="/api/ai")
 http_bearer = HTTPBearer()
 
 
+async def take_ai_tokens(bucket: str, token: str, per_minute: float, burst: float, cost: float = 1.0):
+    """
+    Shed AI queries first when the service is overloaded, and apply a per-user token bucket keyed by
+    the JWT's user id, so logging in again doesn't start a fresh bucket. telemetry-service
+    additionally limits the resulting /query calls per user.
+    """
+    if load_monitor.should_shed(PRIORITY_ANALYTICS):
+        raise too_many_requests(SHED_RETRY_AFTER_SECONDS, "Service is busy, please retry shortly.")
+    user_id = decode_user_id(token)
+    retry_after = await rate_limiter.take(f"{bucket}:{user_id}", per_minute / 60, burst, cost)
+    if retry_after:
+        raise too_many_requests(retry_after)
+
+
+async def limit_ai_queries(token=Depends(http_bearer)):
+    await take_ai_tokens("ai-query", token.credentials, RATE_LIMIT_AI_QUERY_PER_MINUTE, RATE_LIMIT_AI_QUERY_BURST)
+
+
 @app.get("/")
 async def root():
     return {"message": "AI Service Running"}
@@ -46,65 +121,308 @@ async def health_check():
     return {"status": "ok"}
 
 
+@router.get("/metrics")
+async def get_metrics():
+    """In-process metrics: telemetry-service call latency per endpoint, LLM latency and SQL cache hit rate."""
+    snapshot = metrics.snapshot()
+    hits = snapshot["counters"].get("sql_cache.hits", 0)
+    misses = snapshot["counters"].get("sql_cache.misses", 0)
+    snapshot["sql_cache_hit_rate"] = hits / (hits + misses) if hits + misses else 0.0
+    snapshot["telemetry_circuit"] = telemetry_client.breaker.state
+    return snapshot
+
+
 async def get_user_devices_from_telemetry(token: str) -> List[dict]:
-    async with httpx.AsyncClient() as client:
-        headers = {"Authorization": f"Bearer {token}"}
-        try:
-            response = await client.get(f"{TELEMETRY_SERVICE_URL}/devices/details", headers=headers)
-            response.raise_for_status()
-            return response.json()
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(status_code=e.response.status_code, detail=f"Error fetching devices: {e.response.text}")
-        except httpx.RequestError as e:
-            raise HTTPException(status_code=500, detail=f"Request to telemetry service failed: {e}")
+    headers = {"Authorization": f"Bearer {token}"}
+    try:
+        response = await telemetry_client.request("GET", "/devices/details", headers=headers, idempotent=True)
+        return response.json()
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=e.response.status_code, detail=f"Error fetching devices: {e.response.text}")
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=500, detail=f"Request to telemetry service failed: {e}")
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
 
 async def execute_query_on_telemetry(query: str, token: str) -> dict:
-    async with httpx.AsyncClient() as client:
-        headers = {"Authorization": f"Bearer {token}"}
+    headers = {"Authorization": f"Bearer {token}"}
+    try:
+        # Only read-only queries are accepted by telemetry-service, so retrying is safe
+        response = await telemetry_client.request(
+            "POST", "/query", json={"query": query}, headers=headers, idempotent=True
+        )
+        return response.json()
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=e.response.status_code, detail=f"Error executing query: {e.response.text}")
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=500, detail=f"Request to telemetry service failed: {e}")
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+async def execute_queries_on_telemetry(queries: List[str], token: str) -> List[dict]:
+    """Run several queries in one call; each entry is a result, or has `error` if that query failed."""
+    headers = {"Authorization": f"Bearer {token}"}
+    try:
+        response = await telemetry_client.request(
+            "POST", "/query/batch", json={"queries": queries}, headers=headers, idempotent=True
+        )
+        return response.json()
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=e.response.status_code, detail=f"Error executing queries: {e.response.text}")
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=500, detail=f"Request to telemetry service failed: {e}")
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+async def generate_sql(
+    user_query: str, device_details: List[dict], model_name: str, api_key: str, system_prompt=None
+):
+    """
+    Get SQL for the question, reusing SQL generated earlier for the same question and device set
+    to skip the LLM call. Returns the SQL and the cache lookup, to store it once it has run successfully.
+    `system_prompt` is the (prompt, aliases) pair from get_system_prompt, if already built for these devices.
+    SQL that refers to devices the user doesn't have is rejected with 422 rather than executed.
+    """
+    cache_lookup = await sql_cache.lookup(user_query, device_details)
+    sql_query = cache_lookup.sql_query
+    if sql_query is None:
+        system_prompt, device_aliases = system_prompt or get_system_prompt(device_details)
+        with span("llm sql_generation"):
+            sql_query = await get_sql_query(user_query, system_prompt, model_name, api_key)
         try:
-            response = await client.post(f"{TELEMETRY_SERVICE_URL}/query", json={"query": query}, headers=headers)
-            response.raise_for_status()
-            return response.json()
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(status_code=e.response.status_code, detail=f"Error executing query: {e.response.text}")
-        except httpx.RequestError as e:
-            raise HTTPException(status_code=500, detail=f"Request to telemetry service failed: {e}")
+            sql_query = resolve_device_aliases(sql_query, device_aliases)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=f"{e} Try rephrasing the question.")
+    return sql_query, cache_lookup
 
 
-@router.post("/query", response_model=QueryResponse)
+def require_llm():
+    """The configured LLM model and API key, or a 500 if no provider is configured."""
+    try:
+        return get_llm_model_and_api_key()
+    except ValueError:
+        raise HTTPException(status_code=500, detail="AI Query Service not available. LLM API Key not found.")
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@router.post("/query", response_model=QueryResponse, dependencies=[Depends(limit_ai_queries)])
 async def get_telemetry_query_answer(
     user_query: str,
+    request: Request,
+    include_timings: bool = False,
     token: str = Depends(http_bearer),
 ):
     """
     Provide answer to a natural language query from the user, by executing a SQL query and synthesizing the response.
+    With include_timings=true the response also carries the trace id, per-stage timings and LLM token counts.
     """
+    trace = start_trace(request.headers.get("traceparent"))
+    try:
+        response = await answer_query(user_query, token.credentials)
+    except HTTPException as e:
+        trace.finish("ai_query", status_code=e.status_code)
+        raise
+    trace.finish("ai_query", status_code=200)
+    if include_timings:
+        response.trace_id = trace.trace_id
+        response.timings_ms = trace.timings_ms
+        response.token_usage = trace.token_usage
+    return response
+
+
+async def answer_query(user_query: str, token: str) -> QueryResponse:
     # 1. Get user devices from telemetry service
-    device_details = await get_user_devices_from_telemetry(token.credentials)
+    device_details = await get_user_devices_from_telemetry(token)
     if not device_details:
         return QueryResponse(answer="You don't have any devices registered.", sql_query=None, results=None)
 
     # 2. Generate SQL query from natural language
-    try:
-        model_name, api_key = get_llm_model_and_api_key()
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"AI Query Service not available. LLM API Key not found.")
-    
-    system_prompt = get_system_prompt(device_details)
-    sql_query = await get_sql_query(user_query, system_prompt, model_name, api_key)
-    
+    model_name, api_key = require_llm()
+
+    sql_query, cache_lookup = await generate_sql(user_query, device_details, model_name, api_key)
+
     # 3. Execute SQL query on telemetry service
-    results = await execute_query_on_telemetry(sql_query, token.credentials)
+    results = await execute_query_on_telemetry(sql_query, token)
+    if cache_lookup.sql_query is None:
+        # Only cache SQL that ran successfully
+        sql_cache.store(cache_lookup, sql_query)
     
     # 4. Generate final response
-    answer = await generate_final_response(user_query, sql_query, results, device_details, model_name, api_key)
+    with span("llm final_response"):
+        answer = await generate_final_response(user_query, sql_query, results, device_details, model_name, api_key)
     
     return QueryResponse(answer=answer, sql_query=sql_query, results=results)
 
 
+
+@router.post("/query/batch", response_model=BatchQueryResponse)
+async def get_batch_query_answers(
+    batch_request: BatchQueryRequest,
+    request: Request,
+    include_timings: bool = False,
+    token: str = Depends(http_bearer),
+):
+    """
+    Answer several questions about the same user's devices in one call. Devices are fetched and the
+    prompt is built once, SQL is generated and answers are synthesized concurrently, and identical SQL
+    is executed only once, in a single call to telemetry-service. A question that fails gets an `error`
+    without failing the rest of the batch. Each question costs one token from the caller's batch bucket.
+    """
+    questions = batch_request.questions
+    max_questions = min(AI_BATCH_MAX_QUESTIONS, int(RATE_LIMIT_AI_BATCH_BURST))
+    if len(questions) > max_questions:
+        raise HTTPException(status_code=400, detail=f"At most {max_questions} questions per batch.")
+    await take_ai_tokens(
+        "ai-batch", token.credentials, RATE_LIMIT_AI_BATCH_PER_MINUTE, RATE_LIMIT_AI_BATCH_BURST, cost=len(questions)
+    )
+
+    trace = start_trace(request.headers.get("traceparent"))
+    try:
+        answers = await answer_batch(questions, token.credentials)
+    except HTTPException as e:
+        trace.finish("ai_query_batch", status_code=e.status_code, questions=len(questions))
+        raise
+    trace.finish("ai_query_batch", status_code=200, questions=len(questions))
+    response = BatchQueryResponse(answers=answers)
+    if include_timings:
+        response.trace_id = trace.trace_id
+        response.timings_ms = trace.timings_ms
+        response.token_usage = trace.token_usage
+    return response
+
+
+async def answer_batch(questions: List[str], token: str) -> List[BatchQueryAnswer]:
+    device_details = await get_user_devices_from_telemetry(token)
+    if not device_details:
+        return [BatchQueryAnswer(question=q, answer="You don't have any devices registered.") for q in questions]
+
+    model_name, api_key = require_llm()
+
+    system_prompt = get_system_prompt(device_details)
+    semaphore = asyncio.Semaphore(AI_BATCH_CONCURRENCY)
+    answers = [BatchQueryAnswer(question=q) for q in questions]
+
+    # 1. Generate SQL for every distinct question concurrently
+    async def generate(question: str):
+        async with semaphore:
+            return await generate_sql(question, device_details, model_name, api_key, system_prompt)
+
+    distinct_questions = list(dict.fromkeys(questions))
+    generated = dict(zip(
+        distinct_questions,
+        await asyncio.gather(*(generate(q) for q in distinct_questions), return_exceptions=True),
+    ))
+    for answer in answers:
+        outcome = generated[answer.question]
+        if isinstance(outcome, HTTPException):
+            answer.error = outcome.detail
+        elif isinstance(outcome, Exception):
+            answer.error = f"Failed to generate SQL: {outcome}"
+        else:
+            answer.sql_query = outcome[0]
+
+    # 2. Execute each distinct query once
+    distinct_queries = list(dict.fromkeys(a.sql_query for a in answers if a.sql_query))
+    results_by_query = {}
+    if distinct_queries:
+        results = await execute_queries_on_telemetry(distinct_queries, token)
+        results_by_query = dict(zip(distinct_queries, results))
+    for answer in answers:
+        if answer.error:
+            continue
+        results = results_by_query[answer.sql_query]
+        if "error" in results:
+            answer.error = f"Error executing query: {results['error']}"
+            continue
+        answer.results = results
+        cache_lookup = generated[answer.question][1]
+        if cache_lookup.sql_query is None:
+            # Only cache SQL that ran successfully
+            sql_cache.store(cache_lookup, answer.sql_query)
+
+    # 3. Synthesize the answers concurrently
+    async def synthesize(answer: BatchQueryAnswer):
+        async with semaphore:
+            with span("llm final_response"):
+                answer.answer = await generate_final_response(
+                    answer.question, answer.sql_query, answer.results, device_details, model_name, api_key
+                )
+
+    pending = [a for a in answers if a.error is None]
+    synthesized = await asyncio.gather(*(synthesize(a) for a in pending), return_exceptions=True)
+    for answer, outcome in zip(pending, synthesized):
+        if isinstance(outcome, Exception):
+            answer.error = f"Failed to answer query: {outcome}"
+    return answers
+
+
+@router.post("/query/stream", dependencies=[Depends(limit_ai_queries)])
+async def stream_telemetry_query_answer(
+    user_query: str,
+    request: Request,
+    include_timings: bool = False,
+    token: str = Depends(http_bearer),
+):
+    """
+    Streaming variant of /query, as server-sent events. Emits `sql` once the query is generated,
+    `results` as soon as it has executed, then `answer` events with chunks of the final answer as
+    the LLM streams it, and finally `done` (carrying the timings with include_timings=true).
+    Failures after streaming has started arrive as an `error` event.
+    """
+    trace = start_trace(request.headers.get("traceparent"))
+    device_details = await get_user_devices_from_telemetry(token.credentials)
+    model_name, api_key = require_llm()
+
+    async def events():
+        use_trace(trace)
+        if not device_details:
+            yield sse_event("answer", "You don't have any devices registered.")
+            yield sse_event("done", {})
+            return
+        try:
+            sql_query, cache_lookup = await generate_sql(user_query, device_details, model_name, api_key)
+            yield sse_event("sql", sql_query)
+
+            results = await execute_query_on_telemetry(sql_query, token.credentials)
+            if cache_lookup.sql_query is None:
+                sql_cache.store(cache_lookup, sql_query)
+            yield sse_event("results", results)
+
+            with span("llm final_response"):
+                async for chunk in stream_final_response(
+                    user_query, sql_query, results, device_details, model_name, api_key
+                ):
+                    yield sse_event("answer", chunk)
+            trace.finish("ai_query_stream", status_code=200)
+            if include_timings:
+                yield sse_event("done", {
+                    "trace_id": trace.trace_id,
+                    "timings_ms": trace.timings_ms,
+                    "token_usage": trace.token_usage,
+                })
+            else:
+                yield sse_event("done", {})
+        except HTTPException as e:
+            trace.finish("ai_query_stream", status_code=e.status_code)
+            yield sse_event("error", {"status_code": e.status_code, "detail": e.detail})
+        except Exception as e:
+            trace.finish("ai_query_stream", status_code=500)
+            yield sse_event("error", {"status_code": 500, "detail": f"Failed to answer query: {e}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 app.include_router(router)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="127.0.0.1", port=8003, reload=True)
\ No newline at end of file
+    uvicorn.run("main:app", host="127.0.0.1", port=8003, reload=True)
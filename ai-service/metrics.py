@@ -0,0 +1,58 @@
+from collections import defaultdict, deque
+from typing import Dict
+
+
+class LatencyTracker:
+    """Call counts, errors and latency percentiles over the most recent samples."""
+
+    def __init__(self, max_samples: int = 1024):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self._samples: deque = deque(maxlen=max_samples)
+
+    def observe(self, duration_ms: float, error: bool = False):
+        self.count += 1
+        self.total_ms += duration_ms
+        if error:
+            self.errors += 1
+        self._samples.append(duration_ms)
+
+    def _percentile(self, samples: list, p: float) -> float:
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+    def snapshot(self) -> dict:
+        samples = sorted(self._samples)
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "p50_ms": round(self._percentile(samples, 50), 2),
+            "p95_ms": round(self._percentile(samples, 95), 2),
+            "p99_ms": round(self._percentile(samples, 99), 2),
+        }
+
+
+class MetricsRegistry:
+    """In-process metrics, grouped by name, served as JSON from /api/ai/metrics."""
+
+    def __init__(self):
+        self.latencies: Dict[str, LatencyTracker] = defaultdict(LatencyTracker)
+        self.counters: Dict[str, float] = defaultdict(float)
+
+    def observe(self, name: str, duration_ms: float, error: bool = False):
+        self.latencies[name].observe(duration_ms, error)
+
+    def increment(self, name: str, value: float = 1):
+        self.counters[name] += value
+
+    def snapshot(self) -> dict:
+        return {
+            "latency": {name: tracker.snapshot() for name, tracker in self.latencies.items()},
+            "counters": dict(self.counters),
+        }
+
+
+metrics = MetricsRegistry()
@@ -1,7 +1,30 @@
 from typing import Optional, List, Any
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class QueryResponse(BaseModel):
     answer: str
     sql_query: Optional[str] = None
-    results: Optional[dict[str, list[Any]]] = None
\ No newline at end of file
+    results: Optional[dict[str, list[Any]]] = None
+    # Only included when requested with include_timings=true
+    trace_id: Optional[str] = None
+    timings_ms: Optional[dict[str, float]] = None
+    token_usage: Optional[dict[str, int]] = None
+
+
+class BatchQueryRequest(BaseModel):
+    questions: List[str] = Field(min_length=1)
+
+class BatchQueryAnswer(BaseModel):
+    question: str
+    answer: Optional[str] = None
+    sql_query: Optional[str] = None
+    results: Optional[dict[str, list[Any]]] = None
+    # Set instead of answer when this question failed; the rest of the batch is still answered
+    error: Optional[str] = None
+
+class BatchQueryResponse(BaseModel):
+    answers: List[BatchQueryAnswer]
+    # Only included when requested with include_timings=true
+    trace_id: Optional[str] = None
+    timings_ms: Optional[dict[str, float]] = None
+    token_usage: Optional[dict[str, int]] = None
@@ -2,8 +2,17 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 
-from litellm import acompletion
+import asyncio
+import importlib
 import json
+import re
+from collections import defaultdict
+
+from result_summary import compact_results, compact_device_details, estimate_tokens
+from tracing import record_llm_usage
+
+# Approximate token budget for SQL results in the answer-synthesis prompt
+RESULT_TOKEN_BUDGET = int(os.environ.get("RESULT_TOKEN_BUDGET", "2000"))
 
 provider_keys = {
     "gemini": os.environ.get("GEMINI_API_KEY"),
@@ -19,7 +28,42 @@ provider_models = {
     "anthropic": "claude-sonnet-4-20250514"
 }
 
+# litellm takes seconds to import, so it is loaded on first use (or by the warm-up task started with the app)
+# rather than at import time, which would delay /health on every cold start.
+_litellm_import = None
+
+
+def _forget_failed_import(future):
+    """Let the next caller retry instead of re-raising the first failure until restart."""
+    global _litellm_import
+    if future is _litellm_import and (future.cancelled() or future.exception() is not None):
+        _litellm_import = None
+
+
+async def load_litellm():
+    """Import litellm once, in a worker thread so the slow import never blocks the event loop."""
+    global _litellm_import
+    if _litellm_import is None:
+        _litellm_import = asyncio.ensure_future(asyncio.to_thread(importlib.import_module, "litellm"))
+        _litellm_import.add_done_callback(_forget_failed_import)
+    # Shielded, so a cancelled caller doesn't cancel the import that other callers share
+    return await asyncio.shield(_litellm_import)
+
+
+async def llm_completion(model, **kwargs):
+    """Route a completion to litellm, or to the offline scripted LLM for "fake/" models."""
+    if model.startswith("fake/"):
+        import fake_llm
+        return await fake_llm.acompletion(model=model, **kwargs)
+    litellm = await load_litellm()
+    return await litellm.acompletion(model=model, **kwargs)
+
+
 def get_llm_model_and_api_key():
+    # LLM_PROVIDER=fake uses the offline scripted LLM, e.g. for benchmarks
+    if os.environ.get("LLM_PROVIDER") == "fake":
+        return "fake/scripted", "fake"
+
     api_key = ""
     model_name = ""
     for provider in provider_keys:
@@ -32,8 +76,8 @@ def get_llm_model_and_api_key():
         raise ValueError("No API key found")
 
 
-def get_system_prompt(device_details):
-    system_prompt = f"""
+# Static part of the SQL-generation prompt, built once at import. Only the device catalog varies per user.
+STATIC_SYSTEM_PROMPT = """
         You are an expert SQL assistant. Your task is to convert natural language questions into SQL queries and return it in a JSON object with a single key 'query'.
         You must only generate a single, valid SQL query inside the JSON. Do not add any explanations or introductory text.
         The database dialect is Timescaledb.
@@ -68,22 +112,70 @@ def get_system_prompt(device_details):
             device_id 	    ( UUID ) (Foreign Key)
             energy_watts 	( DOUBLE PRECISION )
 
+        Devices are referred to by short aliases like d1, d2. Wherever a device id is needed, write the alias
+        as a quoted string literal (e.g. device_id IN ('d1','d3')); aliases are replaced with the real ids before the query runs.
 
         ### Examples
 
         -- Question: What was the energy usage of my devices in last one week?
-        {{
-            "query": "SELECT device_id, (AVG(telemetry.energy_watts) * (EXTRACT(epoch FROM (MAX(telemetry.timestamp) - MIN(telemetry.timestamp))) / 3600)) / 1000 AS total_kwh FROM telemetry WHERE device_id in ('e35a4495-5313-4a15-b854-5c196b0e94a9','2486c5ab-d4ce-45b0-aebb-9e99ced3b012','a0f4e75d-26aa-4a7a-a982-d630b287e0c3') AND timestamp > now() - INTERVAL '7 days' GROUP BY device_id"
-        }}
+        {
+            "query": "SELECT device_id, (AVG(telemetry.energy_watts) * (EXTRACT(epoch FROM (MAX(telemetry.timestamp) - MIN(telemetry.timestamp))) / 3600)) / 1000 AS total_kwh FROM telemetry WHERE device_id in ('d1','d2','d3') AND timestamp > now() - INTERVAL '7 days' GROUP BY device_id"
+        }
+
+        You are allowed to only perform select query on the telemetry table, utilizing only the device aliases listed below. Always limit your query to atmost 500 results.
 
+        Below are the devices belonging to the user, grouped by product type, as alias=name (or alias ranges when there are many).
+"""
 
-        Below are the device details belonging to the user.
-        {json.dumps(device_details, indent=2)}
+# Approximate token budget for the device catalog in the SQL-generation prompt
+DEVICE_CATALOG_TOKEN_BUDGET = int(os.environ.get("DEVICE_CATALOG_TOKEN_BUDGET", "1500"))
 
-        You are allowed to only perform select query on the telemetry table, utilizing only the above device_ids. Always limit your query to atmost 500 results.
+DEVICE_ALIAS_PATTERN = re.compile(r"'(d\d+)'")
 
-        """
-    return system_prompt
+
+def build_device_catalog(device_details, token_budget=DEVICE_CATALOG_TOKEN_BUDGET):
+    """
+    Encode the user's devices compactly, grouped by product type, with short aliases (d1, d2, ...).
+    Aliases are contiguous within a type, so if listing every name exceeds the budget the catalog
+    falls back to alias ranges per type. Returns the catalog text and the alias -> device id map.
+    """
+    by_type = defaultdict(list)
+    for device in sorted(device_details, key=lambda d: (d["type"], d["name"])):
+        by_type[device["type"]].append(device)
+
+    aliases = {}
+    named_lines, range_lines = [], []
+    for device_type, devices in by_type.items():
+        first = len(aliases) + 1
+        entries = []
+        for device in devices:
+            alias = f"d{len(aliases) + 1}"
+            aliases[alias] = device["id"]
+            entries.append(f"{alias}={device['name']}")
+        named_lines.append(f"{device_type}: {', '.join(entries)}")
+        range_lines.append(f"{device_type}: d{first}..d{len(aliases)} ({len(devices)} devices)")
+
+    catalog = "\n".join(named_lines)
+    if estimate_tokens(catalog) > token_budget:
+        catalog = "\n".join(range_lines)
+    return catalog, aliases
+
+
+def get_system_prompt(device_details):
+    """Returns the SQL-generation system prompt and the device alias map used in it."""
+    catalog, aliases = build_device_catalog(device_details)
+    return STATIC_SYSTEM_PROMPT + catalog + "\n", aliases
+
+
+def resolve_device_aliases(sql_query, aliases):
+    """
+    Replace quoted device aliases in generated SQL with the real device ids.
+    Raises ValueError if the SQL refers to aliases that aren't in the catalog (e.g. made up by the LLM).
+    """
+    unknown = sorted({alias for alias in DEVICE_ALIAS_PATTERN.findall(sql_query) if alias not in aliases})
+    if unknown:
+        raise ValueError(f"The generated query refers to unknown devices: {', '.join(unknown)}.")
+    return DEVICE_ALIAS_PATTERN.sub(lambda m: f"'{aliases[m.group(1)]}'", sql_query)
 
 
 async def get_sql_query(user_question, system_prompt, model_name, api_key):
@@ -91,33 +183,59 @@ async def get_sql_query(user_question, system_prompt, model_name, api_key):
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_question},
     ]
-    resp = await acompletion(
+    resp = await llm_completion(
         model=model_name,
         api_key=api_key,
         messages=messages,
         response_format={"type": "json_object"})
+    record_llm_usage(resp)
     
     sql_query = json.loads(resp.choices[0].message.content)['query']
     return sql_query
 
 
-async def generate_final_response(user_question, sql_query, sql_query_result, device_details, model_name, api_key):
-    
+def get_final_response_messages(user_question, sql_query, sql_query_result, device_details):
+    # Large results are summarized so the prompt (and LLM latency/cost) doesn't grow with row or device
+    # count. The device list comes out of the same budget, capped at a quarter of it.
+    devices = compact_device_details(device_details, sql_query, sql_query_result, RESULT_TOKEN_BUDGET // 4)
+    results = compact_results(sql_query_result, RESULT_TOKEN_BUDGET - estimate_tokens(devices))
     prompt = (
         "Given the following user question, device details, corresponding SQL query, "
         "and SQL result, answer the user question.\n\n"
         f"Question: {user_question}\n"
-        f"Device Details: {device_details}\n"
+        f"Device Details:\n{devices}\n"
         f"SQL Query: {sql_query}\n"
-        f"SQL Result: {sql_query_result}"
+        f"SQL Result:\n{results}"
     )
-    messages = [
+    return [
         {"role": "user", "content": prompt},
     ]
-    resp = await acompletion(
+
+
+async def generate_final_response(user_question, sql_query, sql_query_result, device_details, model_name, api_key):
+    messages = get_final_response_messages(user_question, sql_query, sql_query_result, device_details)
+    resp = await llm_completion(
         model=model_name,
         api_key=api_key,
         messages=messages,
     )    
+    record_llm_usage(resp)
     response = resp.choices[0].message.content
-    return response
\ No newline at end of file
+    return response
+
+
+async def stream_final_response(user_question, sql_query, sql_query_result, device_details, model_name, api_key):
+    """Same as generate_final_response, but yields the answer text as the LLM streams it."""
+    messages = get_final_response_messages(user_question, sql_query, sql_query_result, device_details)
+    resp = await llm_completion(
+        model=model_name,
+        api_key=api_key,
+        messages=messages,
+        stream=True,
+    )
+    async for chunk in resp:
+        # Providers that report usage while streaming put it on the final chunk, which may have no choices
+        record_llm_usage(chunk)
+        content = chunk.choices[0].delta.content if chunk.choices else None
+        if content:
+            yield content
@@ -0,0 +1,157 @@
+import re
+from datetime import datetime, timezone
+from typing import Any, List, Optional
+
+import numpy as np
+
+# Distinct values / rows listed per column or ranking in a summary
+TOP_K = 5
+
+UUID_PATTERN = re.compile(r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for budgeting prompts."""
+    return len(text) // 4 + 1
+
+
+def format_value(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    return str(value)
+
+
+def format_table(columns: List[str], rows: List[dict]) -> str:
+    """Pipe-separated table; far fewer tokens than the repr of a list of dicts."""
+    lines = [" | ".join(columns)]
+    lines.extend(" | ".join(format_value(row.get(column)) for column in columns) for row in rows)
+    return "\n".join(lines)
+
+
+def as_numeric(values: list) -> Optional[np.ndarray]:
+    """Column as a float array (None -> NaN), or None if it isn't numeric."""
+    if all(v is None for v in values) or any(isinstance(v, bool) for v in values):
+        return None
+    try:
+        return np.array(values, dtype=float)
+    except (ValueError, TypeError):
+        return None
+
+
+def as_datetime(values: list) -> Optional[np.ndarray]:
+    """Column as UTC datetime64 array, or None if it isn't timestamps."""
+    first = next((v for v in values if v is not None), None)
+    if not isinstance(first, str) or len(first) < 10 or first[4] != "-":
+        return None
+    try:
+        parsed = []
+        for v in values:
+            ts = datetime.fromisoformat(v) if v is not None else None
+            if ts is not None and ts.tzinfo is not None:
+                ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+            parsed.append(ts)
+        return np.array(parsed, dtype="datetime64[s]")
+    except (ValueError, TypeError):
+        return None
+
+
+def summarize_results(columns: List[str], rows: List[dict]) -> List[str]:
+    """Per-column statistics, time range, top-k and trend lines, computed column-wise with NumPy."""
+    lines = [f"Rows: {len(rows)}"]
+    numeric = {}
+    time_column = None
+
+    for column in columns:
+        values = [row.get(column) for row in rows]
+        if (arr := as_datetime(values)) is not None:
+            valid = arr[~np.isnat(arr)]
+            if valid.size:
+                lines.append(f"- {column}: time, {valid.min()} to {valid.max()} UTC")
+                time_column = time_column or (column, arr)
+        elif (arr := as_numeric(values)) is not None:
+            numeric[column] = arr
+            valid = arr[~np.isnan(arr)]
+            if valid.size:
+                lines.append(
+                    f"- {column}: numeric, min {valid.min():.4g}, max {valid.max():.4g}, "
+                    f"mean {valid.mean():.4g}, sum {valid.sum():.4g}, std {valid.std():.4g}, nulls {arr.size - valid.size}"
+                )
+        else:
+            distinct, counts = np.unique(np.array([str(v) for v in values]), return_counts=True)
+            order = np.argsort(counts)[::-1][:TOP_K]
+            top = ", ".join(f"{distinct[i]} ({counts[i]})" for i in order)
+            lines.append(f"- {column}: text, {distinct.size} distinct, most common: {top}")
+
+    if numeric:
+        # Rank rows by the last numeric column; generated SQL usually puts the measure last
+        rank_column, arr = list(numeric.items())[-1]
+        top_rows = [rows[i] for i in np.argsort(np.nan_to_num(arr, nan=-np.inf))[::-1][:TOP_K]]
+        lines.append(f"Top {len(top_rows)} rows by {rank_column}:")
+        lines.append(format_table(columns, top_rows))
+
+    if time_column and numeric:
+        name, times = time_column
+        hours = (times - times.min()).astype("timedelta64[s]").astype(float) / 3600
+        for column, arr in numeric.items():
+            mask = ~np.isnan(arr) & ~np.isnat(times)
+            if mask.sum() >= 3 and np.ptp(hours[mask]) > 0:
+                slope = np.polyfit(hours[mask], arr[mask], 1)[0]
+                lines.append(f"Trend of {column} over {name}: {slope:+.4g} per hour")
+
+    return lines
+
+
+def compact_results(results: Optional[dict], token_budget: int) -> str:
+    """
+    Render SQL results for the answer-synthesis prompt within roughly `token_budget` tokens.
+    Small results are sent in full as a compact table; larger ones as a statistical summary
+    followed by as many leading rows as still fit.
+    """
+    if not results or not results.get("rows"):
+        return "No rows returned."
+    rows = results["rows"]
+    columns = results.get("columns") or list(rows[0].keys())
+
+    full_table = format_table(columns, rows)
+    if estimate_tokens(full_table) <= token_budget:
+        return full_table
+
+    summary = "\n".join(summarize_results(columns, rows))
+    remaining = token_budget - estimate_tokens(summary)
+    sample_lines = [" | ".join(columns)]
+    for row in rows:
+        line = " | ".join(format_value(row.get(column)) for column in columns)
+        remaining -= estimate_tokens(line)
+        if remaining < 0:
+            break
+        sample_lines.append(line)
+
+    if len(sample_lines) > 1:
+        summary += f"\nFirst {len(sample_lines) - 1} of {len(rows)} rows:\n" + "\n".join(sample_lines)
+    return summary
+
+
+def compact_device_details(
+    device_details: List[dict], sql_query: Optional[str], results: Optional[dict], token_budget: int
+) -> str:
+    """
+    Name the devices whose ids appear in the SQL or its results, within roughly `token_budget` tokens,
+    so the answer can refer to devices by name. Other devices play no part in the answer.
+    """
+    referenced = set(UUID_PATTERN.findall(sql_query or ""))
+    for row in (results or {}).get("rows") or []:
+        referenced.update(str(value) for value in row.values())
+    devices = [d for d in device_details if str(d["id"]) in referenced]
+    if not devices:
+        return f"None of the user's {len(device_details)} devices are referenced by id."
+
+    lines = []
+    remaining = token_budget
+    for device in devices:
+        line = f"{device['name']} ({device['type']}): {device['id']}"
+        remaining -= estimate_tokens(line)
+        if remaining < 0:
+            lines.append(f"... and {len(devices) - len(lines)} more")
+            break
+        lines.append(line)
+    return "\n".join(lines)
@@ -0,0 +1,24 @@
+import os
+
+import jwt
+from fastapi import HTTPException, status
+
+
+def decode_user_id(token: str) -> int:
+    """
+    Validate a JWT issued by auth-service with the shared JWT_SECRET_KEY and return its user id (`sub`).
+    telemetry-service checks the token again on every call made on the user's behalf.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    try:
+        payload = jwt.decode(
+            token, os.environ["JWT_SECRET_KEY"], algorithms=[os.getenv("JWT_ALGORITHM", "HS256")]
+        )
+        return int(payload.get("sub"))
+    # Catch JWT errors and a missing or non-numeric sub
+    except (jwt.PyJWTError, TypeError, ValueError):
+        raise credentials_exception
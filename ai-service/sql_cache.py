@@ -0,0 +1,138 @@
+import hashlib
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from metrics import metrics
+
+
+def normalize_question(question: str) -> str:
+    """
+    Lowercase, collapse whitespace and drop trailing `?`, `!` and `.`, so trivially different phrasings
+    share a key. Everything else is kept: operators, decimal points, signs and `%` change the SQL.
+    """
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+
+def device_set_hash(device_details: List[dict]) -> str:
+    """Hash of the user's devices. Generated SQL embeds device ids, so it is only reusable for the same set."""
+    canonical = "|".join(sorted(f"{d['id']}:{d.get('name')}:{d.get('type')}" for d in device_details))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def cosine_similarity(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+@dataclass
+class CacheEntry:
+    sql_query: str
+    created_at: float
+    embedding: Optional[List[float]] = None
+
+
+@dataclass
+class CacheLookup:
+    """Result of a lookup. Passed back to `store` on a miss, so the question isn't re-normalized or re-embedded."""
+    devices_key: str
+    question_key: str
+    sql_query: Optional[str] = None
+    embedding: Optional[List[float]] = field(default=None, repr=False)
+
+
+class SQLQueryCache:
+    """
+    LRU/TTL cache of generated SQL, keyed by normalized question and the user's device set.
+    If `embedding_model` is set, a question that misses exactly can still hit a cached question
+    for the same device set whose embedding is at least `similarity_threshold` similar.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        ttl_seconds: float = 24 * 3600,
+        embedding_model: Optional[str] = None,
+        similarity_threshold: float = 0.95,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.embedding_model = embedding_model
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[tuple, CacheEntry]" = OrderedDict()
+        # Embedded question keys per device set, so similarity search only scans one user's questions
+        self._embedded: Dict[str, set] = {}
+
+    def _get_fresh(self, key: tuple) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.created_at > self.ttl_seconds:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def _embed(self, text: str) -> Optional[List[float]]:
+        from query_helper import load_litellm
+
+        try:
+            litellm = await load_litellm()
+            resp = await litellm.aembedding(model=self.embedding_model, input=[text])
+            return resp.data[0]["embedding"]
+        except Exception as e:
+            # Similarity lookup is best-effort; exact matches still work
+            print(f"SQL cache embedding failed: {e}")
+            return None
+
+    async def lookup(self, question: str, device_details: List[dict]) -> CacheLookup:
+        lookup = CacheLookup(devices_key=device_set_hash(device_details), question_key=normalize_question(question))
+
+        entry = self._get_fresh((lookup.devices_key, lookup.question_key))
+        if entry is None and self.embedding_model:
+            lookup.embedding = await self._embed(lookup.question_key)
+            if lookup.embedding is not None:
+                entry = self._most_similar(lookup)
+
+        if entry is not None:
+            lookup.sql_query = entry.sql_query
+            metrics.increment("sql_cache.hits")
+            # Credit the average generation time we just skipped
+            generation = metrics.latencies.get("llm sql_generation")
+            if generation and generation.count:
+                metrics.increment("sql_cache.saved_ms", generation.total_ms / generation.count)
+        else:
+            metrics.increment("sql_cache.misses")
+        return lookup
+
+    def _most_similar(self, lookup: CacheLookup) -> Optional[CacheEntry]:
+        best_key, best_score = None, self.similarity_threshold
+        for question_key in list(self._embedded.get(lookup.devices_key, ())):
+            entry = self._get_fresh((lookup.devices_key, question_key))
+            if entry is None:
+                continue
+            score = cosine_similarity(lookup.embedding, entry.embedding)
+            if score >= best_score:
+                best_key, best_score = question_key, score
+        return self._entries.get((lookup.devices_key, best_key)) if best_key else None
+
+    def _remove(self, key: tuple):
+        entry = self._entries.pop(key)
+        if entry.embedding is not None:
+            embedded = self._embedded[key[0]]
+            embedded.discard(key[1])
+            if not embedded:
+                del self._embedded[key[0]]
+
+    def store(self, lookup: CacheLookup, sql_query: str):
+        key = (lookup.devices_key, lookup.question_key)
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = CacheEntry(sql_query, time.monotonic(), lookup.embedding)
+        if lookup.embedding is not None:
+            self._embedded.setdefault(lookup.devices_key, set()).add(lookup.question_key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
@@ -0,0 +1,161 @@
+import asyncio
+import random
+import time
+from typing import Optional
+
+import httpx
+
+from tracing import current_trace, record_timing, parse_server_timing
+
+# Responses that mean telemetry-service is unreachable or overloaded; these count against the breaker
+UNAVAILABLE_STATUS_CODES = {502, 503, 504}
+
+# Failures worth retrying for idempotent calls: the request never reached telemetry-service, so
+# retrying doesn't repeat its work. A read timeout or 504 may mean a slow query is still running.
+RETRYABLE_STATUS_CODES = {502, 503}
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for `reset_timeout` seconds.
+    After that a single trial call is let through (half-open); success closes the circuit again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        state = self.state
+        if state == "open" or (state == "half-open" and self._trial_in_flight):
+            raise CircuitOpenError("Telemetry service circuit is open.")
+        if state == "half-open":
+            self._trial_in_flight = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def abandon_call(self):
+        """The call ended without an outcome (e.g. it was cancelled); let another trial through."""
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.failures >= self.failure_threshold or self.opened_at is not None:
+            self.opened_at = time.monotonic()
+
+
+class TelemetryClient:
+    """
+    Shared, keep-alive pooled HTTP client for calls to telemetry-service.
+    Opened and closed with the app lifespan. Idempotent calls that didn't reach telemetry-service
+    are retried with jittered exponential backoff, a circuit breaker fails fast while
+    telemetry-service is down, and latency is recorded per endpoint.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        max_retries: int = 2,
+        backoff_base_seconds: float = 0.1,
+        connect_timeout: float = 3.0,
+        read_timeout: float = 30.0,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+    ):
+        self.base_url = base_url
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self.breaker = CircuitBreaker()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        try:
+            import h2  # noqa: F401
+            http2 = True
+        except ImportError:  # HTTP/2 needs the optional h2 package
+            http2 = False
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url, timeout=self.timeout, limits=self.limits, http2=http2
+        )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def request(self, method: str, path: str, idempotent: bool = False, **kwargs) -> httpx.Response:
+        """
+        Send a request and return the response, raising httpx.HTTPStatusError for error statuses,
+        httpx.RequestError if the service is unreachable, or CircuitOpenError while the circuit is open.
+        """
+        if self._client is None:
+            await self.start()
+        attempts = 1 + (self.max_retries if idempotent else 0)
+
+        # Propagate the current trace so telemetry-service logs can be joined with ours
+        trace = current_trace()
+        if trace is not None:
+            kwargs["headers"] = {**kwargs.get("headers", {}), "traceparent": trace.traceparent()}
+
+        for attempt in range(attempts):
+            self.breaker.before_call()
+            started = time.perf_counter()
+            try:
+                response = await self._client.request(method, path, **kwargs)
+            except httpx.RequestError as e:
+                self._observe(method, path, started, error=True)
+                self.breaker.record_failure()
+                if not isinstance(e, RETRYABLE_ERRORS) or attempt + 1 >= attempts:
+                    raise
+            except BaseException:
+                # Cancelled (e.g. the client disconnected); don't leave a half-open trial in flight forever
+                self.breaker.abandon_call()
+                raise
+            else:
+                self._observe(method, path, started, error=response.status_code >= 500, response=response)
+                # Only an unreachable or overloaded service trips the breaker. A 500 from a bad
+                # query is the caller's problem and must not open the circuit for everyone.
+                if response.status_code in UNAVAILABLE_STATUS_CODES:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt + 1 >= attempts:
+                    response.raise_for_status()
+                    return response
+
+            # Full jitter: sleep a random amount up to the exponential backoff
+            await asyncio.sleep(random.uniform(0, self.backoff_base_seconds * 2 ** attempt))
+
+    def _observe(self, method: str, path: str, started: float, error: bool, response: Optional[httpx.Response] = None):
+        name = f"telemetry {method} {path}"
+        record_timing(name, (time.perf_counter() - started) * 1000, error)
+        # Server-side breakdown reported by telemetry-service, e.g. time spent in the database
+        trace = current_trace()
+        if trace is not None and response is not None:
+            for stage, duration_ms in parse_server_timing(response.headers.get("server-timing", "")).items():
+                trace.record(f"{name} [{stage}]", duration_ms)
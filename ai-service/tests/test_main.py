@@ -0,0 +1,18 @@
+import pytest
+from fastapi import HTTPException
+
+import main
+import query_helper
+
+
+def test_require_llm_uses_the_configured_provider(monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "fake")
+    assert main.require_llm() == ("fake/scripted", "fake")
+
+
+def test_require_llm_without_a_provider_is_a_server_error(monkeypatch):
+    monkeypatch.delenv("LLM_PROVIDER", raising=False)
+    monkeypatch.setattr(query_helper, "provider_keys", {provider: None for provider in query_helper.provider_keys})
+    with pytest.raises(HTTPException) as excinfo:
+        main.require_llm()
+    assert excinfo.value.status_code == 500
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+import query_helper
+from query_helper import build_device_catalog, resolve_device_aliases
+
+DEVICES = [
+    {"id": "11111111-1111-1111-1111-111111111111", "name": "Fridge", "type": "appliance"},
+    {"id": "22222222-2222-2222-2222-222222222222", "name": "Heater", "type": "appliance"},
+    {"id": "33333333-3333-3333-3333-333333333333", "name": "Car", "type": "ev"},
+]
+
+
+def test_catalog_aliases_are_grouped_by_type():
+    catalog, aliases = build_device_catalog(DEVICES)
+    assert aliases == {
+        "d1": DEVICES[0]["id"],
+        "d2": DEVICES[1]["id"],
+        "d3": DEVICES[2]["id"],
+    }
+    assert "appliance: d1=Fridge, d2=Heater" in catalog
+
+
+def test_aliases_are_resolved():
+    _, aliases = build_device_catalog(DEVICES)
+    sql = "SELECT * FROM telemetry WHERE device_id IN ('d1', 'd3')"
+    assert resolve_device_aliases(sql, aliases) == (
+        f"SELECT * FROM telemetry WHERE device_id IN ('{DEVICES[0]['id']}', '{DEVICES[2]['id']}')"
+    )
+
+
+def test_unknown_alias_is_rejected():
+    _, aliases = build_device_catalog(DEVICES)
+    with pytest.raises(ValueError, match="d99"):
+        resolve_device_aliases("SELECT * FROM telemetry WHERE device_id IN ('d1', 'd99')", aliases)
+
+
+def test_failed_litellm_import_is_retried(monkeypatch):
+    attempts = []
+
+    def import_module(name):
+        attempts.append(name)
+        if len(attempts) == 1:
+            raise ImportError("transient failure")
+        return "litellm module"
+
+    monkeypatch.setattr(query_helper, "_litellm_import", None)
+    monkeypatch.setattr(query_helper.importlib, "import_module", import_module)
+
+    async def run():
+        with pytest.raises(ImportError):
+            await query_helper.load_litellm()
+        # Let the done callback run
+        await asyncio.sleep(0)
+        assert await query_helper.load_litellm() == "litellm module"
+        assert await query_helper.load_litellm() == "litellm module"
+
+    asyncio.run(run())
+    assert len(attempts) == 2
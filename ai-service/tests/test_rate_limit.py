@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+
+from rate_limit import InMemoryRateLimiter, TokenBucket
+
+
+def test_bucket_allows_burst_then_reports_wait():
+    bucket = TokenBucket(capacity=10, now=0.0)
+    assert bucket.take(rate=2, capacity=10, cost=10, now=0.0) == 0.0
+    assert bucket.take(rate=2, capacity=10, cost=4, now=0.0) == pytest.approx(2.0)
+    assert bucket.take(rate=2, capacity=10, cost=4, now=2.0) == 0.0
+
+
+def test_bucket_refill_is_capped_at_capacity():
+    bucket = TokenBucket(capacity=10, now=0.0)
+    bucket.take(rate=1, capacity=10, cost=10, now=0.0)
+    bucket.take(rate=1, capacity=10, cost=0, now=1000.0)
+    assert bucket.tokens == 10
+
+
+def test_limiter_rejects_cost_above_capacity():
+    limiter = InMemoryRateLimiter()
+    with pytest.raises(ValueError):
+        asyncio.run(limiter.take("device", rate=20, capacity=100, cost=200))
+
+
+def test_limiter_evicts_least_recently_used_keys():
+    limiter = InMemoryRateLimiter(max_keys=2)
+
+    async def run():
+        for key in ("a", "b", "a", "c"):
+            await limiter.take(key, rate=1, capacity=1)
+
+    asyncio.run(run())
+    assert list(limiter._buckets) == ["a", "c"]
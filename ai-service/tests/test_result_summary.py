@@ -0,0 +1,40 @@
+from result_summary import compact_device_details, compact_results, estimate_tokens
+
+DEVICES = [
+    {"id": f"00000000-0000-0000-0000-{i:012d}", "name": f"Device {i}", "type": "appliance"}
+    for i in range(1, 501)
+]
+
+
+def test_small_results_are_sent_in_full():
+    results = {"columns": ["name", "kwh"], "rows": [{"name": "Fridge", "kwh": 1.5}]}
+    assert compact_results(results, token_budget=100) == "name | kwh\nFridge | 1.5"
+
+
+def test_large_results_fit_the_budget():
+    rows = [{"hour": f"2025-01-01T{h % 24:02d}:00:00+00:00", "kwh": float(h)} for h in range(5000)]
+    text = compact_results({"columns": ["hour", "kwh"], "rows": rows}, token_budget=300)
+    assert "Rows: 5000" in text
+    assert estimate_tokens(text) <= 300
+
+
+def test_only_referenced_devices_are_listed():
+    sql = f"SELECT SUM(energy_watts) FROM telemetry WHERE device_id = '{DEVICES[0]['id']}'"
+    results = {"rows": [{"device_id": DEVICES[2]["id"], "kwh": 3.0}]}
+    text = compact_device_details(DEVICES, sql, results, token_budget=500)
+    assert text.splitlines() == [
+        f"Device 1 (appliance): {DEVICES[0]['id']}",
+        f"Device 3 (appliance): {DEVICES[2]['id']}",
+    ]
+
+
+def test_device_list_fits_the_budget():
+    results = {"rows": [{"device_id": d["id"]} for d in DEVICES]}
+    text = compact_device_details(DEVICES, None, results, token_budget=200)
+    assert estimate_tokens(text) <= 220
+    assert text.endswith("more")
+
+
+def test_no_referenced_devices():
+    text = compact_device_details(DEVICES, "SELECT 1", {"rows": [{"total": 1}]}, token_budget=200)
+    assert "500 devices" in text
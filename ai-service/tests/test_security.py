@@ -0,0 +1,56 @@
+import time
+
+import jwt
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import main
+from models import QueryResponse
+from security import decode_user_id
+
+SECRET = "test-secret-" + "0" * 32
+
+
+@pytest.fixture(autouse=True)
+def jwt_secret(monkeypatch):
+    monkeypatch.setenv("JWT_SECRET_KEY", SECRET)
+
+
+def make_token(user_id, secret: str = SECRET, **claims) -> str:
+    return jwt.encode({"sub": str(user_id), "exp": int(time.time()) + 3600, **claims}, secret, algorithm="HS256")
+
+
+def test_decode_user_id():
+    assert decode_user_id(make_token(42)) == 42
+
+
+@pytest.mark.parametrize("token", [
+    make_token(42, secret="other-secret-" + "0" * 32),
+    jwt.encode({"sub": "42", "exp": int(time.time()) - 10}, SECRET, algorithm="HS256"),
+    jwt.encode({"email": "a@b.c"}, SECRET, algorithm="HS256"),
+    "not-a-jwt",
+])
+def test_invalid_tokens_are_rejected(token):
+    with pytest.raises(HTTPException) as excinfo:
+        decode_user_id(token)
+    assert excinfo.value.status_code == 401
+
+
+def test_new_login_shares_the_users_rate_limit_bucket(monkeypatch):
+    async def answer_query(user_query, token):
+        return QueryResponse(answer="ok", sql_query=None, results=None)
+
+    monkeypatch.setattr(main, "answer_query", answer_query)
+    monkeypatch.setattr(main, "rate_limiter", main.create_rate_limiter(None))
+    client = TestClient(main.app)
+
+    def ask(token):
+        return client.post("/api/ai/query", params={"user_query": "hi"}, headers={"Authorization": f"Bearer {token}"})
+
+    burst = int(main.RATE_LIMIT_AI_QUERY_BURST)
+    for i in range(burst):
+        # A fresh token per request, as if the user logged in again each time
+        assert ask(make_token(7, iat=i)).status_code == 200
+    assert ask(make_token(7, iat=burst)).status_code == 429
+    assert ask(make_token(8)).status_code == 200
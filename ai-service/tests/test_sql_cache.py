@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from sql_cache import SQLQueryCache, normalize_question
+
+DEVICES = [{"id": "11111111-1111-1111-1111-111111111111", "name": "Fridge", "type": "appliance"}]
+
+
+def lookup_and_store(cache: SQLQueryCache, question: str, sql_query: str):
+    lookup = asyncio.run(cache.lookup(question, DEVICES))
+    if lookup.sql_query is None:
+        cache.store(lookup, sql_query)
+    return lookup
+
+
+def test_trivial_differences_share_a_key():
+    assert normalize_question("  How much did the Fridge use  today?") == "how much did the fridge use today"
+    assert normalize_question("how much did the fridge use today!?") == normalize_question("How much did the fridge use today")
+
+
+@pytest.mark.parametrize("a, b", [
+    ("Which devices used > 100 W last week?", "Which devices used < 100 W last week?"),
+    ("Which devices used >= 100 W?", "Which devices used = 100 W?"),
+    ("Devices above 1.5 kW", "Devices above 15 kW"),
+    ("Readings below -5 W", "Readings below 5 W"),
+    ("Devices using 10% of the total", "Devices using 10 of the total"),
+])
+def test_questions_with_different_meaning_do_not_collide(a, b):
+    assert normalize_question(a) != normalize_question(b)
+
+
+def test_colliding_questions_get_their_own_sql():
+    cache = SQLQueryCache()
+    lookup_and_store(cache, "Which devices used > 100 W last week?", "SELECT ... > 100")
+    lookup = lookup_and_store(cache, "Which devices used < 100 W last week?", "SELECT ... < 100")
+    assert lookup.sql_query is None
+    assert lookup_and_store(cache, "which devices used > 100 W last week", "").sql_query == "SELECT ... > 100"
+
+
+def test_sql_is_only_reused_for_the_same_devices():
+    cache = SQLQueryCache()
+    lookup_and_store(cache, "How much today?", "SELECT 1")
+    other = asyncio.run(cache.lookup("How much today?", DEVICES + [{"id": "x", "name": "Car", "type": "ev"}]))
+    assert other.sql_query is None
+
+
+def test_lru_eviction():
+    cache = SQLQueryCache(max_entries=2)
+    for question in ["a", "b", "c"]:
+        lookup_and_store(cache, question, f"SELECT '{question}'")
+    assert asyncio.run(cache.lookup("a", DEVICES)).sql_query is None
+    assert asyncio.run(cache.lookup("c", DEVICES)).sql_query == "SELECT 'c'"
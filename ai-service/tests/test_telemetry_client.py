@@ -0,0 +1,173 @@
+import asyncio
+
+import httpx
+import pytest
+
+from telemetry_client import CircuitBreaker, CircuitOpenError, TelemetryClient
+
+
+def make_client(handler, **kwargs) -> TelemetryClient:
+    client = TelemetryClient("http://telemetry", backoff_base_seconds=0, **kwargs)
+    client._client = httpx.AsyncClient(base_url="http://telemetry", transport=httpx.MockTransport(handler))
+    return client
+
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == "closed"
+
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_breaker_success_resets_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_half_open_allows_a_single_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.state == "half-open"
+
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_call()
+
+
+def test_failed_trial_reopens():
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=60)
+    for _ in range(5):
+        breaker.record_failure()
+    breaker.opened_at -= 60
+    assert breaker.state == "half-open"
+
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_abandoned_trial_lets_the_next_one_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.abandon_call()
+    breaker.before_call()
+
+
+def test_server_errors_from_bad_queries_do_not_open_the_circuit():
+    client = make_client(lambda request: httpx.Response(500, json={"detail": "invalid input syntax for type uuid"}))
+
+    async def run():
+        for _ in range(10):
+            with pytest.raises(httpx.HTTPStatusError):
+                await client.request("POST", "/query", json={"query": "SELECT 1"})
+
+    asyncio.run(run())
+    assert client.breaker.state == "closed"
+
+
+def test_unavailable_service_opens_the_circuit():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503)
+
+    client = make_client(handler, max_retries=0)
+
+    async def run():
+        for _ in range(client.breaker.failure_threshold):
+            with pytest.raises(httpx.HTTPStatusError):
+                await client.request("GET", "/devices/details", idempotent=True)
+        with pytest.raises(CircuitOpenError):
+            await client.request("GET", "/devices/details", idempotent=True)
+
+    asyncio.run(run())
+    assert len(calls) == client.breaker.failure_threshold
+
+
+def test_idempotent_calls_are_retried():
+    responses = iter([httpx.Response(503), httpx.Response(502), httpx.Response(200, json=[])])
+    client = make_client(lambda request: next(responses), max_retries=2)
+
+    response = asyncio.run(client.request("GET", "/devices/details", idempotent=True))
+    assert response.status_code == 200
+    assert client.breaker.state == "closed"
+
+
+def test_cancelled_trial_does_not_wedge_the_circuit():
+    async def handler(request):
+        await asyncio.sleep(10)
+        return httpx.Response(200)
+
+    client = make_client(handler)
+    client.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    client.breaker.record_failure()
+
+    async def run():
+        trial = asyncio.create_task(client.request("GET", "/devices/details"))
+        await asyncio.sleep(0.01)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+    asyncio.run(run())
+    assert client.breaker.state == "half-open"
+    client.breaker.before_call()
+
+
+@pytest.mark.parametrize("error", [httpx.ReadTimeout, httpx.RemoteProtocolError])
+def test_requests_that_may_have_run_are_not_retried(error):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        raise error("timed out", request=request)
+
+    client = make_client(handler, max_retries=2)
+    with pytest.raises(error):
+        asyncio.run(client.request("POST", "/query", json={"query": "SELECT 1"}, idempotent=True))
+    assert len(calls) == 1
+
+
+def test_gateway_timeout_is_not_retried():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(504)
+
+    client = make_client(handler, max_retries=2)
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(client.request("POST", "/query", json={"query": "SELECT 1"}, idempotent=True))
+    assert len(calls) == 1
+    assert client.breaker.failures == 1
+
+
+@pytest.mark.parametrize("error", [httpx.ConnectError, httpx.ConnectTimeout])
+def test_connect_failures_are_retried(error):
+    outcomes = iter([error, error, None])
+
+    def handler(request):
+        outcome = next(outcomes)
+        if outcome is not None:
+            raise outcome("unreachable", request=request)
+        return httpx.Response(200, json={"rows": []})
+
+    client = make_client(handler, max_retries=2)
+    response = asyncio.run(client.request("POST", "/query", json={"query": "SELECT 1"}, idempotent=True))
+    assert response.status_code == 200
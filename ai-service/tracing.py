@@ -0,0 +1,103 @@
+import json
+import re
+import secrets
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from metrics import metrics
+
+# W3C trace context: version-trace_id-parent_span_id-flags
+TRACEPARENT_PATTERN = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-[0-9a-f]{16}-[0-9a-f]{2}$")
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+
+
+class Trace:
+    """Per-request timings (ms per stage) and LLM token counts, tied together by a trace id."""
+
+    def __init__(self, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or secrets.token_hex(16)
+        self.started = time.perf_counter()
+        self.timings_ms: Dict[str, float] = {}
+        self.token_usage: Dict[str, int] = {"prompt_tokens": 0, "completion_tokens": 0}
+
+    def traceparent(self) -> str:
+        """Header value for an outgoing call, as a child span of this trace."""
+        return f"00-{self.trace_id}-{secrets.token_hex(8)}-01"
+
+    def record(self, name: str, duration_ms: float):
+        self.timings_ms[name] = round(self.timings_ms.get(name, 0.0) + duration_ms, 2)
+
+    def add_usage(self, usage):
+        if usage is None:
+            return
+        self.token_usage["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+        self.token_usage["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+
+    def finish(self, event: str, **fields) -> Dict[str, float]:
+        """Record the total time and log the trace as one structured event. Returns the timings."""
+        self.record("total", (time.perf_counter() - self.started) * 1000)
+        print(json.dumps({
+            "event": event,
+            "trace_id": self.trace_id,
+            "timings_ms": self.timings_ms,
+            "token_usage": self.token_usage,
+            **fields,
+        }))
+        return self.timings_ms
+
+
+def start_trace(traceparent: Optional[str] = None) -> Trace:
+    """Start a trace for this request, continuing the caller's trace id if a valid traceparent is given."""
+    match = TRACEPARENT_PATTERN.match(traceparent or "")
+    trace = Trace(match.group(1) if match else None)
+    _current_trace.set(trace)
+    return trace
+
+
+def use_trace(trace: Trace):
+    _current_trace.set(trace)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def record_timing(name: str, duration_ms: float, error: bool = False):
+    """Record a stage both in the aggregate metrics and in the current request's trace."""
+    metrics.observe(name, duration_ms, error)
+    trace = current_trace()
+    if trace is not None:
+        trace.record(name, duration_ms)
+
+
+def record_llm_usage(response):
+    trace = current_trace()
+    if trace is not None:
+        trace.add_usage(getattr(response, "usage", None))
+
+
+@contextmanager
+def span(name: str):
+    started = time.perf_counter()
+    error = False
+    try:
+        yield
+    except Exception:
+        error = True
+        raise
+    finally:
+        record_timing(name, (time.perf_counter() - started) * 1000, error)
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    """Parse a Server-Timing header like 'db;dur=12.3, total;dur=15.0'."""
+    timings = {}
+    for entry in header.split(","):
+        name, _, params = entry.strip().partition(";")
+        match = re.search(r"dur=([\d.]+)", params)
+        if name and match:
+            timings[name] = float(match.group(1))
+    return timings
@@ -27,6 +27,8 @@ class Settings(BaseSettings):
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
 
+    ENVIRONMENT: str = "development"
+
     model_config = SettingsConfigDict(env_file=".env")
 
 settings = Settings()
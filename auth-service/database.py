@@ -7,7 +7,8 @@ from typing import AsyncGenerator
 from config import settings
 
 # Create an async engine, which is the correct way for async FastAPI
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
+# SQL echo logging is costly under load; keep it to development
+engine = create_async_engine(settings.DATABASE_URL, echo=settings.ENVIRONMENT == "development")
 
 async def init_db():
     async with engine.begin() as conn:
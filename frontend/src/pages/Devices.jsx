@@ -29,6 +29,7 @@ const Devices = () => {
   const [deviceTelemetry, setDeviceTelemetry] = useState([]);
   const [telemetryLoading, setTelemetryLoading] = useState(false);
   const [telemetryError, setTelemetryError] = useState('');
+  const [liveReading, setLiveReading] = useState(null);
   
   // State for the inputs, separate from the state that triggers the fetch
   const [telemetryInputParams, setTelemetryInputParams] = useState({
@@ -118,6 +119,16 @@ const Devices = () => {
     loadDeviceTelemetry();
   }, [token, selectedDevice, telemetryRequestParams]);
 
+  // Live readings for the selected device, pushed by the server instead of re-polling
+  useEffect(() => {
+    if (!token || !selectedDevice) return;
+    setLiveReading(null);
+    const unsubscribe = telemetryService.subscribeTelemetryStream(
+      [selectedDevice.id],
+      (reading) => setLiveReading(reading)
+    );
+    return unsubscribe;
+  }, [token, selectedDevice]);
 
   const intervalOptions = [
     { value: '1h', label: '1 Hour' },
@@ -222,6 +233,12 @@ const Devices = () => {
       {selectedDevice && (
         <div style={{ marginTop: '2rem' }}>
           <h2>Telemetry for {selectedDevice.name} (Avg Watts)</h2>
+          {liveReading && (
+            <p>
+              Live: {liveReading.energy_watts.toFixed(1)} W at{' '}
+              {new Date(liveReading.timestamp).toLocaleTimeString()}
+            </p>
+          )}
           
           <div style={{ marginBottom: '1rem', display: 'flex', alignItems: 'center' }}>
             <div>
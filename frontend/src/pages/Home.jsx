@@ -20,8 +20,13 @@ const Home = () => {
     setError('');
     setAiResponse(null);
     try {
-      const response = await aiService.query(query);
-      setAiResponse(response);
+      // Show each stage as soon as it arrives instead of waiting for the whole answer
+      setAiResponse({ answer: '', sql_query: null, results: null });
+      await aiService.queryStream(query, {
+        onSql: (sql) => setAiResponse(prev => ({ ...prev, sql_query: sql })),
+        onResults: (results) => setAiResponse(prev => ({ ...prev, results })),
+        onAnswer: (chunk) => setAiResponse(prev => ({ ...prev, answer: prev.answer + chunk })),
+      });
     } catch (err) {
       setError(err.message || 'An error occurred.');
     } finally {
@@ -83,7 +88,7 @@ const Home = () => {
             {aiResponse && (
               <div style={{ marginTop: '2rem', padding: '1rem', border: '1px solid #eee', borderRadius: '5px' }}>
                 <h3>Answer</h3>
-                <p>{aiResponse.answer}</p>
+                <p>{aiResponse.answer || (loading && 'Thinking...')}</p>
                 {aiResponse.results && (
                   <>
                     <h4>Data</h4>
@@ -26,8 +26,42 @@ export const query = async (userQuery) => {
   }
 };
 
+// Streams the answer as server-sent events. `handlers` may define onSql, onResults and onAnswer
+// (called with each chunk of answer text). Resolves when the stream is done.
+// Uses fetch rather than EventSource, since EventSource can't POST or send an Authorization header.
+export const queryStream = async (userQuery, handlers = {}) => {
+  const response = await fetch(
+    `${AI_API_URL}/query/stream?user_query=${encodeURIComponent(userQuery)}`,
+    { method: 'POST', headers: { ...getAuthHeader() } }
+  );
+  if (!response.ok) {
+    const body = await response.json().catch(() => ({}));
+    throw new Error(body.detail || 'Failed to get answer from AI service.');
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const events = buffer.split('\n\n');
+    buffer = events.pop();
+    for (const raw of events) {
+      const event = raw.match(/^event: (.*)$/m)?.[1];
+      const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] ?? 'null');
+      if (event === 'sql') handlers.onSql?.(data);
+      else if (event === 'results') handlers.onResults?.(data);
+      else if (event === 'answer') handlers.onAnswer?.(data);
+      else if (event === 'error') throw new Error(data.detail || 'Failed to get answer from AI service.');
+    }
+  }
+};
+
 const aiService = {
   query,
+  queryStream,
 };
 
 export default aiService;
@@ -59,10 +59,24 @@ export const fetchDeviceTelemetry = async (deviceId, start, end, interval) => {
   }
 };
 
+// Opens a WebSocket that pushes new readings for the user's devices as they are ingested.
+// Returns a function that closes the stream.
+export const subscribeTelemetryStream = (deviceIds, onReading) => {
+  const token = localStorage.getItem('token');
+  if (!token) return () => {};
+  const params = new URLSearchParams({ token });
+  (deviceIds || []).forEach((id) => params.append('device_id', id));
+  const wsUrl = TELEMETRY_API_URL.replace(/^http/, 'ws');
+  const socket = new WebSocket(`${wsUrl}/stream?${params.toString()}`);
+  socket.onmessage = (event) => onReading(JSON.parse(event.data));
+  return () => socket.close();
+};
+
 const telemetryService = {
   fetchDevices,
   fetchEnergySummary,
   fetchDeviceTelemetry,
+  subscribeTelemetryStream,
 };
 
 export default telemetryService;
@@ -0,0 +1,112 @@
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+import httpx
+
+
+TELEMETRY_API_BASE = os.getenv("TELEMETRY_API_BASE", "http://localhost:8002/api/telemetry")
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def run_load(name: str, make_request, duration: float, concurrency: int, cores: int):
+    """Issue requests from `concurrency` workers for `duration` seconds and print throughput."""
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                resp = await make_request()
+                if resp.status_code >= 300:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    rps = len(latencies) / elapsed
+    print(
+        f"{name:<8} {len(latencies):>8} req  {rps:>9.1f} req/s  {rps / cores:>9.1f} req/s/core  "
+        f"p50 {percentile(latencies, 50) * 1000:>7.1f} ms  p99 {percentile(latencies, 99) * 1000:>7.1f} ms  "
+        f"errors {errors}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Measure health, ingest and series endpoint throughput.")
+    parser.add_argument("--base-url", default=TELEMETRY_API_BASE)
+    parser.add_argument("--token", default=os.getenv("TELEMETRY_TOKEN"), help="JWT of the devices' owner")
+    parser.add_argument("--device-id", action="append", default=[], type=uuid.UUID,
+                        help="Device(s) owned by the token's user. Repeat to spread ingest load. "
+                             "Without any, only /health (serving overhead, no database) is measured.")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per endpoint")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--cores", type=int, default=int(os.getenv("WEB_CONCURRENCY", 1)),
+                        help="CPU cores (workers) the server ran with, for req/s/core")
+    args = parser.parse_args()
+
+    # Unique timestamps so every ingest request is a real insert, not a duplicate
+    next_ts = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+    async with httpx.AsyncClient(
+        base_url=args.base_url,
+        limits=httpx.Limits(max_connections=args.concurrency),
+        timeout=30.0,
+    ) as client:
+
+        async def ingest():
+            nonlocal next_ts
+            next_ts += timedelta(milliseconds=1)
+            return await client.post("/", json={
+                "device_id": str(random.choice(args.device_id)),
+                "timestamp": next_ts.isoformat(),
+                "energy_watts": random.uniform(5, 250),
+            })
+
+        end = datetime.now(timezone.utc)
+        series_params = {
+            "start": (end - timedelta(days=7)).isoformat(),
+            "end": end.isoformat(),
+            "interval": "1h",
+        }
+        headers = {"Authorization": f"Bearer {args.token}"}
+
+        async def series():
+            device_id = random.choice(args.device_id)
+            return await client.get(f"/devices/{device_id}", params=series_params, headers=headers)
+
+        async def health():
+            return await client.get("/health")
+
+        print(f"{args.concurrency} concurrent clients, {args.duration:.0f}s per endpoint, {args.cores} core(s)")
+        await run_load("health", health, args.duration, args.concurrency, args.cores)
+        if not args.device_id:
+            print("ingest   skipped (no --device-id)")
+            return
+        await run_load("ingest", ingest, args.duration, args.concurrency, args.cores)
+        if args.token:
+            await run_load("series", series, args.duration, args.concurrency, args.cores)
+        else:
+            print("series   skipped (no --token)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
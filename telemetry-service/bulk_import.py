@@ -0,0 +1,137 @@
+import csv
+import json
+import math
+import uuid
+from datetime import datetime, timezone
+from typing import AsyncIterator, List, Set
+
+from database import engine
+
+# Rows validated and copied per transaction. Each committed chunk advances the resumable offset.
+IMPORT_CHUNK_ROWS = 50_000
+
+IMPORT_COLUMNS = ["device_id", "timestamp", "energy_watts"]
+
+CREATE_STAGING_TABLE = (
+    "CREATE TEMP TABLE IF NOT EXISTS telemetry_staging "
+    "(device_id UUID, \"timestamp\" TIMESTAMPTZ, energy_watts DOUBLE PRECISION) "
+    "ON COMMIT DELETE ROWS"
+)
+
+MERGE_STAGING_TABLE = (
+    "INSERT INTO telemetry (device_id, \"timestamp\", energy_watts) "
+    "SELECT device_id, \"timestamp\", energy_watts FROM telemetry_staging "
+    "ON CONFLICT (device_id, \"timestamp\") DO NOTHING"
+)
+
+
+class TelemetryImportError(ValueError):
+    """Raised when an import stops early. `committed_offset` is where a retry should resume."""
+
+    def __init__(self, message: str, committed_offset: int, rows_inserted: int):
+        super().__init__(message)
+        self.committed_offset = committed_offset
+        self.rows_inserted = rows_inserted
+
+
+def parse_line(line: bytes, format: str) -> tuple:
+    """Parse one CSV (`device_id,timestamp,energy_watts`) or NDJSON line into a telemetry record."""
+    text = line.decode("utf-8")
+    if format == "ndjson":
+        data = json.loads(text)
+        device_id, timestamp, watts = data["device_id"], data["timestamp"], data["energy_watts"]
+    else:
+        device_id, timestamp, watts = next(csv.reader([text]))
+
+    ts = datetime.fromisoformat(timestamp)
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    watts = float(watts)
+    if not math.isfinite(watts):
+        raise ValueError(f"energy_watts must be finite, got {watts}")
+    return uuid.UUID(device_id), ts, watts
+
+
+async def copy_chunk(raw_conn, records: List[tuple]) -> int:
+    """COPY a chunk into the session's staging table, then merge it into telemetry. Returns rows inserted."""
+    async with raw_conn.transaction():
+        await raw_conn.execute(CREATE_STAGING_TABLE)
+        await raw_conn.copy_records_to_table("telemetry_staging", records=records, columns=IMPORT_COLUMNS)
+        status = await raw_conn.execute(MERGE_STAGING_TABLE)
+    # Status looks like "INSERT 0 <count>"
+    return int(status.split()[-1])
+
+
+async def import_telemetry_stream(
+    body: AsyncIterator[bytes],
+    format: str,
+    allowed_device_ids: Set[uuid.UUID],
+    start_offset: int = 0,
+) -> dict:
+    """
+    Validate and import a CSV/NDJSON byte stream in chunks, without holding the file in memory.
+    `start_offset` is the byte offset in the original file where `body` begins; a CSV header is
+    only expected at offset 0. Raises TelemetryImportError with the last committed offset on bad rows.
+    """
+    rows_received = 0
+    rows_inserted = 0
+    offset = start_offset              # bytes consumed so far
+    committed_offset = start_offset    # bytes durably imported so far
+    expect_header = format == "csv" and start_offset == 0
+    records: List[tuple] = []
+    buffer = b""
+
+    async with engine.connect() as conn:
+        raw_conn = (await conn.get_raw_connection()).driver_connection
+
+        async def flush():
+            nonlocal records, rows_inserted, committed_offset
+            if records:
+                rows_inserted += await copy_chunk(raw_conn, records)
+                records = []
+            committed_offset = offset
+            print(f"Import progress: {rows_received} rows read, {rows_inserted} inserted, offset {committed_offset}")
+
+        def handle_line(line: bytes):
+            nonlocal offset, rows_received, expect_header
+            line_offset = offset
+            offset += len(line) + 1
+            line = line.strip()
+            if expect_header:
+                expect_header = False
+                if line.startswith(b"device_id"):
+                    return
+            if not line:
+                return
+            try:
+                record = parse_line(line, format)
+            except (ValueError, KeyError, TypeError, StopIteration) as e:
+                raise TelemetryImportError(f"Invalid row at byte {line_offset}: {e}", committed_offset, rows_inserted)
+            if record[0] not in allowed_device_ids:
+                raise TelemetryImportError(
+                    f"Device {record[0]} at byte {line_offset} not found or access denied.",
+                    committed_offset, rows_inserted,
+                )
+            records.append(record)
+            rows_received += 1
+
+        async for chunk in body:
+            buffer += chunk
+            lines = buffer.split(b"\n")
+            buffer = lines.pop()
+            for line in lines:
+                handle_line(line)
+            if len(records) >= IMPORT_CHUNK_ROWS:
+                await flush()
+
+        if buffer:
+            handle_line(buffer)
+            # The last line had no trailing newline
+            offset -= 1
+        await flush()
+
+    return {
+        "rows_received": rows_received,
+        "rows_inserted": rows_inserted,
+        "committed_offset": committed_offset,
+    }
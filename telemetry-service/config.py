@@ -22,10 +22,41 @@ class Settings(BaseSettings):
             )
         return v
 
+    # Connection pool (also used to detect pool saturation for load shedding)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+
     # JWT settings
     JWT_SECRET_KEY: str
     JWT_ALGORITHM: str = "HS256"
     
+    # Streaming per-device statistics
+    STATS_WINDOW_SIZE: int = 60          # readings kept for rolling min/max
+    STATS_EWMA_ALPHA: float = 0.1
+    STATS_CHECKPOINT_SECONDS: float = 60.0
+    ANOMALY_SIGMA: float = 3.0           # readings beyond k-sigma are flagged
+    ANOMALY_MIN_SAMPLES: int = 30        # don't flag until the baseline is meaningful
+
+    # Rate limiting and load shedding
+    RATE_LIMIT_INGEST_PER_SECOND: float = 20.0   # readings per device
+    RATE_LIMIT_INGEST_BURST: float = 100.0
+    RATE_LIMIT_QUERY_PER_MINUTE: float = 30.0    # ad-hoc queries/exports per user
+    RATE_LIMIT_QUERY_BURST: float = 10.0
+    QUERY_BATCH_MAX_QUERIES: int = 20
+    RATE_LIMIT_QUERY_BATCH_PER_MINUTE: float = 2.0   # batched queries per user, e.g. nightly reports
+    RATE_LIMIT_QUERY_BATCH_BURST: float = 20.0
+    RATE_LIMIT_REDIS_URL: Optional[str] = None   # share buckets across replicas
+    SHED_MAX_LOOP_LAG_MS: float = 200.0
+    SHED_MAX_POOL_UTILIZATION: float = 0.9
+
+    # Energy cost
+    COST_MAX_RANGE_DAYS: int = 366
+    COST_CACHE_MAX_ENTRIES: int = 10000
+    COST_CACHE_SETTLE_SECONDS: float = 86400.0   # periods ending this long ago are closed and cached
+
+    # Request tracing: traced requests are always logged, others only when slower than this
+    TRACE_LOG_SLOW_REQUEST_MS: float = 500.0
+
     # Add an environment setting
     ENVIRONMENT: str = "development"
 
@@ -8,7 +8,18 @@ from typing import AsyncGenerator
 from config import settings
 
 # Create an async engine, which is the correct way for async FastAPI
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
+engine = create_async_engine(
+    settings.DATABASE_URL,
+    # SQL echo logging is costly under load; keep it to development
+    echo=settings.ENVIRONMENT == "development",
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+)
+
+
+def pool_utilization() -> float:
+    """Fraction of the pool's connections (including overflow) currently checked out."""
+    return engine.pool.checkedout() / (settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW)
 
 async def create_db_and_tables(max_retries: int = 3, base_delay_seconds: float = 5.0):
     attempt = 1
@@ -21,10 +32,13 @@ async def create_db_and_tables(max_retries: int = 3, base_delay_seconds: float =
 
                 # 2) Create ORM tables we own (exclude stub-only tables)
                 #    Use create_all with include_tables to avoid creating the external 'user' table stub.
-                from models import Product, Device, Telemetry
+                from models import Product, Device, Telemetry, DeviceStatsCheckpoint, Tariff, TariffRate
                 await conn.run_sync(
                     SQLModel.metadata.create_all,
-                    tables=[Product.__table__, Device.__table__, Telemetry.__table__],
+                    tables=[
+                        Product.__table__, Device.__table__, Telemetry.__table__,
+                        DeviceStatsCheckpoint.__table__, Tariff.__table__, TariffRate.__table__,
+                    ],
                 )
 
                 # 3) Convert telemetry into a hypertable (idempotent)
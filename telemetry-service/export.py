@@ -0,0 +1,133 @@
+import asyncio
+import contextlib
+import uuid
+import zlib
+from datetime import datetime
+from typing import AsyncIterator
+
+from database import engine
+
+# Chunks buffered between the COPY and the HTTP response. Keeps memory flat when the client is slow.
+EXPORT_QUEUE_CHUNKS = 16
+
+# Rows per Parquet row group (and per fetch from the server-side cursor)
+PARQUET_ROW_GROUP_SIZE = 100_000
+
+EXPORT_QUERY = (
+    'SELECT "timestamp", energy_watts FROM telemetry '
+    'WHERE device_id = $1 AND "timestamp" >= $2 AND "timestamp" <= $3 '
+    'ORDER BY "timestamp"'
+)
+
+
+async def stream_csv_export(
+    device_id: uuid.UUID, start: datetime, end: datetime, compress: bool = True
+) -> AsyncIterator[bytes]:
+    """
+    Stream a device's raw readings as CSV straight from Postgres `COPY ... TO STDOUT`,
+    optionally gzip-compressed on the fly.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=EXPORT_QUEUE_CHUNKS)
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 -> gzip container
+
+    async def on_chunk(chunk: bytes):
+        await queue.put(chunk)
+
+    async with engine.connect() as conn:
+        raw_conn = (await conn.get_raw_connection()).driver_connection
+
+        async def run_copy():
+            try:
+                await raw_conn.copy_from_query(
+                    EXPORT_QUERY, device_id, start, end,
+                    output=on_chunk, format="csv", header=True,
+                )
+            finally:
+                # Mark the end of the stream, unless the reader has gone and cancelled the copy
+                if not asyncio.current_task().cancelling():
+                    await queue.put(None)
+
+        copy_task = asyncio.create_task(run_copy())
+        try:
+            while (chunk := await queue.get()) is not None:
+                if compressor:
+                    chunk = compressor.compress(chunk)
+                if chunk:
+                    yield chunk
+            # Surface any COPY error instead of silently truncating the export
+            await copy_task
+            if compressor:
+                yield compressor.flush()
+        finally:
+            if not copy_task.done():
+                # Let the COPY unwind before its connection is released back to the pool
+                copy_task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await copy_task
+
+
+class _ChunkSink:
+    """Write-only file object that hands back whatever Parquet bytes were written since the last drain."""
+
+    closed = False
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def stream_parquet_export(
+    device_id: uuid.UUID, start: datetime, end: datetime
+) -> AsyncIterator[bytes]:
+    """
+    Stream a device's raw readings as Parquet, reading from a server-side cursor
+    and writing one row group per fetched chunk.
+    """
+    # Optional dependency; checked by the endpoint before streaming starts
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("timestamp", pa.timestamp("us", tz="UTC")),
+        ("energy_watts", pa.float64()),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+
+    async with engine.connect() as conn:
+        raw_conn = (await conn.get_raw_connection()).driver_connection
+        async with raw_conn.transaction():
+            cursor = await raw_conn.cursor(EXPORT_QUERY, device_id, start, end)
+            while records := await cursor.fetch(PARQUET_ROW_GROUP_SIZE):
+                table = pa.table(
+                    {
+                        "timestamp": [r["timestamp"] for r in records],
+                        "energy_watts": [r["energy_watts"] for r in records],
+                    },
+                    schema=schema,
+                )
+                writer.write_table(table, row_group_size=PARQUET_ROW_GROUP_SIZE)
+                yield sink.drain()
+
+    writer.close()
+    yield sink.drain()
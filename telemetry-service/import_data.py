@@ -0,0 +1,107 @@
+import argparse
+import asyncio
+import os
+from pathlib import Path
+
+import httpx
+
+
+TELEMETRY_API_BASE = os.getenv("TELEMETRY_API_BASE", "http://localhost:8002/api/telemetry")
+
+# Bytes read from disk per upload chunk
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Bytes sent per import request. Progress is saved after each request, so a dropped connection
+# costs at most one request's worth of re-upload (replayed rows are ignored as duplicates).
+UPLOAD_REQUEST_BYTES = 64 * 1024 * 1024
+
+
+def request_end(path: Path, start: int, total_size: int, request_bytes: int) -> int:
+    """End of the request starting at `start`: about `request_bytes` later, extended to the end of a line."""
+    if start + request_bytes >= total_size:
+        return total_size
+    with path.open("rb") as f:
+        # Back one byte, so a cut that already falls just after a newline stays there
+        f.seek(start + request_bytes - 1)
+        f.readline()
+        return f.tell()
+
+
+async def read_file(path: Path, start: int, end: int, total_size: int):
+    """Yield the file from `start` to `end` in chunks, printing upload progress."""
+    sent = start
+    with path.open("rb") as f:
+        f.seek(start)
+        while sent < end and (chunk := f.read(min(UPLOAD_CHUNK_BYTES, end - sent))):
+            sent += len(chunk)
+            print(f"\r  Uploaded {sent / total_size:.1%} ({sent}/{total_size} bytes)", end="", flush=True)
+            yield chunk
+    print()
+
+
+async def import_file(path: Path, token: str, format: str, offset: int, progress_file: Path) -> int:
+    """
+    Upload a CSV/NDJSON file to the bulk import endpoint in bounded requests, saving the committed
+    byte offset to `progress_file` after each one. Returns the final committed offset.
+    """
+    total_size = path.stat().st_size
+    print(f"Importing {path} ({format}) from byte {offset}...")
+    rows_received = rows_inserted = 0
+    async with httpx.AsyncClient(timeout=None) as client:
+        while offset < total_size:
+            end = request_end(path, offset, total_size, UPLOAD_REQUEST_BYTES)
+            resp = await client.post(
+                f"{TELEMETRY_API_BASE}/import",
+                params={"format": format, "offset": offset},
+                headers={"Authorization": f"Bearer {token}", "Content-Type": "application/octet-stream"},
+                content=read_file(path, offset, end, total_size),
+            )
+            if resp.status_code == 422 and isinstance(resp.json().get("detail"), dict):
+                detail = resp.json()["detail"]
+                print(f"Import stopped: {detail['message']}")
+                progress_file.write_text(str(detail["committed_offset"]))
+                return detail["committed_offset"]
+            resp.raise_for_status()
+            result = resp.json()
+            rows_received += result["rows_received"]
+            rows_inserted += result["rows_inserted"]
+            offset = result["committed_offset"]
+            progress_file.write_text(str(offset))
+    print(f"Import complete: {rows_received} rows read, {rows_inserted} new rows inserted.")
+    return offset
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import historical telemetry from a CSV or NDJSON file.")
+    parser.add_argument("file", type=Path, help="CSV (device_id,timestamp,energy_watts) or NDJSON file")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="Defaults to the file extension")
+    parser.add_argument("--token", default=os.getenv("TELEMETRY_TOKEN"), help="JWT of the devices' owner")
+    parser.add_argument("--offset", type=int, help="Byte offset to resume from (defaults to the saved progress)")
+    args = parser.parse_args()
+
+    if not args.token:
+        parser.error("A JWT is required via --token or TELEMETRY_TOKEN.")
+    format = args.format or ("ndjson" if args.file.suffix in (".ndjson", ".jsonl") else "csv")
+
+    # Committed progress is saved next to the file, so re-running resumes where it stopped
+    progress_file = args.file.with_name(args.file.name + ".offset")
+    offset = args.offset
+    if offset is None:
+        offset = int(progress_file.read_text()) if progress_file.exists() else 0
+
+    try:
+        committed_offset = asyncio.run(import_file(args.file, args.token, format, offset, progress_file))
+    except httpx.HTTPError as e:
+        saved = int(progress_file.read_text()) if progress_file.exists() else offset
+        print(f"\nImport failed: {e}. Re-run to resume from the last saved offset ({saved}).")
+        raise SystemExit(1)
+
+    if committed_offset >= args.file.stat().st_size:
+        progress_file.unlink(missing_ok=True)
+    else:
+        print(f"Progress saved at byte {committed_offset}. Fix the file and re-run to resume.")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
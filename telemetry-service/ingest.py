@@ -0,0 +1,67 @@
+import math
+import struct
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models import Telemetry
+from pubsub import broker
+from stats import registry as stats_registry
+from config import settings
+
+# Binary record sent by the ingestion gateway: sequence number (uint64),
+# timestamp (float64 epoch seconds), energy_watts (float64), little-endian.
+RECORD_FORMAT = struct.Struct("<Qdd")
+
+# asyncpg allows at most 32767 bind parameters per statement; 3 per telemetry row
+MAX_ROWS_PER_INSERT = 5000
+
+# Highest sequence number acknowledged per device, so a reconnecting device can resume
+# from where it left off. Replays beyond this are still harmless, as inserts ignore
+# duplicate (device_id, timestamp) keys.
+last_acked_seq: Dict[uuid.UUID, int] = {}
+
+
+def decode_records(frame: bytes) -> List[tuple]:
+    """Decode a binary frame of packed (seq, timestamp, watts) records."""
+    if len(frame) % RECORD_FORMAT.size != 0:
+        raise ValueError(f"Frame length must be a multiple of {RECORD_FORMAT.size} bytes.")
+    records = []
+    for index, (seq, ts, watts) in enumerate(RECORD_FORMAT.iter_unpack(frame)):
+        if not math.isfinite(watts):
+            raise ValueError(f"Record {index} has a non-finite energy_watts value.")
+        try:
+            timestamp = datetime.fromtimestamp(ts, tz=timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            # NaN, inf, or outside the years datetime can represent
+            raise ValueError(f"Record {index} has an out-of-range timestamp: {ts}.")
+        records.append((seq, timestamp, watts))
+    return records
+
+
+async def insert_telemetry_rows(session: AsyncSession, rows: List[dict]):
+    """
+    Bulk insert telemetry rows, ignoring duplicates on (device_id, timestamp),
+    then update per-device rolling stats and fan them out to live subscribers once committed.
+    """
+    inserted = []
+    for start in range(0, len(rows), MAX_ROWS_PER_INSERT):
+        stmt = pg_insert(Telemetry).values(rows[start:start + MAX_ROWS_PER_INSERT])
+        stmt = stmt.on_conflict_do_nothing(index_elements=['device_id', 'timestamp'])
+        # Only rows that were actually inserted come back, so replays don't skew stats
+        stmt = stmt.returning(Telemetry.device_id, Telemetry.timestamp, Telemetry.energy_watts)
+        result = await session.execute(stmt)
+        inserted.extend(result.all())
+    await session.commit()
+
+    for row in inserted:
+        stats = stats_registry.update(row.device_id, row.energy_watts, row.timestamp)
+        broker.publish(row.device_id, {
+            "device_id": str(row.device_id),
+            "timestamp": row.timestamp.isoformat(),
+            "energy_watts": row.energy_watts,
+            "is_anomaly": stats.is_anomaly(settings.ANOMALY_SIGMA),
+        })
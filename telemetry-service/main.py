@@ -1,9 +1,11 @@
 import os
-from fastapi import FastAPI, Depends, HTTPException, APIRouter, Body
+import asyncio
+from fastapi import FastAPI, Depends, HTTPException, APIRouter, Body, WebSocket, WebSocketDisconnect, Query, Request
 from contextlib import asynccontextmanager
-from typing import Annotated, Union, List
-from sqlalchemy.dialects.postgresql import insert as pg_insert
+from typing import Annotated, Union, List, Literal
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from fastapi.responses import StreamingResponse
 from sqlmodel import select
 from sqlalchemy.exc import ProgrammingError
 from sqlalchemy import func, and_, text, literal_column
@@ -11,13 +13,25 @@ from datetime import datetime, timedelta, timezone
 import uuid
 import re
 
-from database import get_session, create_db_and_tables
+from database import engine, get_session, create_db_and_tables, pool_utilization
 from sqlmodel.ext.asyncio.session import AsyncSession
 from models import (
     Telemetry, TelemetryData, Device, DevicePublic, 
-    DeviceEnergySummary, TelemetryBucket, Product, QueryRequest
+    DeviceEnergySummary, TelemetryBucket, Product, QueryRequest, BatchQueryRequest, DeviceStats, TariffSchedule, EnergyCost
 )
-from security import get_current_user, UserClaims
+from security import get_current_user, decode_user_claims, UserClaims
+from pubsub import broker
+from ingest import insert_telemetry_rows, decode_records, last_acked_seq
+from stats import registry as stats_registry
+from export import stream_csv_export, stream_parquet_export
+from bulk_import import import_telemetry_stream, TelemetryImportError
+from tariffs import CostCache, get_tariff_schedule, save_tariff_schedule, compute_costs, bucket_offset_minutes
+from rate_limit import (
+    create_rate_limiter, too_many_requests, LoadMonitor,
+    PRIORITY_READ, PRIORITY_ANALYTICS, SHED_RETRY_AFTER_SECONDS,
+)
+from config import settings
+from tracing import TracingMiddleware, span
 
 
 def is_read_only_query(sql: str) -> bool:
@@ -45,9 +59,15 @@ if os.getenv("ENABLE_DEBUGPY") == "true":
 async def lifespan(app: FastAPI):
     print("Initializing database...")
     await create_db_and_tables()
+    await stats_registry.load()
+    checkpoint_task = asyncio.create_task(stats_registry.run_checkpoints())
+    load_monitor_task = asyncio.create_task(load_monitor.run())
     yield
+    checkpoint_task.cancel()
+    load_monitor_task.cancel()
+    await stats_registry.checkpoint()
 
-app = FastAPI(lifespan=lifespan, title="Telemetry Service API")
+app = FastAPI(lifespan=lifespan, title="Telemetry Service API", default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -56,12 +76,62 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(TracingMiddleware, log_slower_than_ms=settings.TRACE_LOG_SLOW_REQUEST_MS)
 
 router = APIRouter(prefix="/api/telemetry")
 
 DBSession = Annotated[AsyncSession, Depends(get_session)]
 CurrentUserClaims = Annotated[UserClaims, Depends(get_current_user)]
 
+rate_limiter = create_rate_limiter(settings.RATE_LIMIT_REDIS_URL)
+load_monitor = LoadMonitor(
+    max_loop_lag_ms=settings.SHED_MAX_LOOP_LAG_MS,
+    max_pool_utilization=settings.SHED_MAX_POOL_UTILIZATION,
+    pool_utilization=pool_utilization,
+)
+cost_cache = CostCache(settings.COST_CACHE_MAX_ENTRIES, settings.COST_CACHE_SETTLE_SECONDS)
+
+
+async def check_device_rate_limit(device_id: uuid.UUID, readings: int = 1) -> float:
+    """Take `readings` tokens from the device's ingest bucket. Returns seconds to wait, or 0 if allowed."""
+    return await rate_limiter.take(
+        f"ingest:{device_id}",
+        settings.RATE_LIMIT_INGEST_PER_SECOND,
+        settings.RATE_LIMIT_INGEST_BURST,
+        cost=readings,
+    )
+
+
+def shed_load(priority: int):
+    """Dependency that rejects the request with 429 while the service is overloaded for this priority."""
+    async def dependency():
+        if load_monitor.should_shed(priority):
+            raise too_many_requests(SHED_RETRY_AFTER_SECONDS, "Service is busy, please retry shortly.")
+    return Depends(dependency)
+
+
+async def limit_user_queries(current_user: CurrentUserClaims):
+    """Per-user token bucket for expensive ad-hoc query, import and export endpoints."""
+    retry_after = await rate_limiter.take(
+        f"query:{current_user.user_id}",
+        settings.RATE_LIMIT_QUERY_PER_MINUTE / 60,
+        settings.RATE_LIMIT_QUERY_BURST,
+    )
+    if retry_after:
+        raise too_many_requests(retry_after)
+
+
+async def limit_user_batch_queries(current_user: UserClaims, count: int):
+    """Per-user token bucket for batched queries, charged one token per query."""
+    retry_after = await rate_limiter.take(
+        f"query-batch:{current_user.user_id}",
+        settings.RATE_LIMIT_QUERY_BATCH_PER_MINUTE / 60,
+        settings.RATE_LIMIT_QUERY_BATCH_BURST,
+        cost=count,
+    )
+    if retry_after:
+        raise too_many_requests(retry_after)
+
 
 @router.get("/")
 async def root():
@@ -82,25 +152,125 @@ async def post_telemetry(
     Accepts a single telemetry data point.
     Uses a high-performance insert that ignores duplicates.
     """
-    values_to_insert = [telemetry_input.model_dump()]
-
-    # Use SQLAlchemy Core for a high-performance bulk insert.
-    stmt = pg_insert(Telemetry).values(values_to_insert)
-
-    # Ignore duplicates on the primary key (device_id, timestamp)
-    stmt = stmt.on_conflict_do_nothing(
-        index_elements=['device_id', 'timestamp']
-    )
+    retry_after = await check_device_rate_limit(telemetry_input.device_id)
+    if retry_after:
+        raise too_many_requests(retry_after)
 
     try:
-        await session.execute(stmt)
-        await session.commit()
+        # Same bulk write path as the ingestion gateway; also fans out to live dashboards
+        await insert_telemetry_rows(session, [telemetry_input.model_dump()])
         return {"message": "Telemetry data successfully processed."}
     except Exception as e:
         await session.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
 
 
+@router.websocket("/ingest/{device_id}")
+async def ingest_telemetry_stream(
+    websocket: WebSocket,
+    device_id: uuid.UUID,
+    token: str = Query(...),
+):
+    """
+    Long-lived ingestion gateway for high-frequency devices.
+    The connection is authenticated once, then each binary frame carries one or more packed
+    (seq, timestamp, watts) records (see `ingest.RECORD_FORMAT`). Every frame is written in bulk
+    and acknowledged with the highest persisted sequence number. On connect the server sends
+    the last acknowledged sequence, so a reconnecting device can resume without duplicates,
+    and the most new records a frame may carry (the device's rate-limit burst).
+    """
+    try:
+        current_user = decode_user_claims(token)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        device_result = await session.exec(
+            select(Device.id).where(Device.id == device_id, Device.user_id == current_user.user_id)
+        )
+        if not device_result.first():
+            await websocket.close(code=1008, reason="Device not found or access denied.")
+            return
+
+    await websocket.accept()
+    max_records_per_frame = int(settings.RATE_LIMIT_INGEST_BURST)
+    await websocket.send_json({
+        "last_seq": last_acked_seq.get(device_id, 0),
+        "max_records_per_frame": max_records_per_frame,
+    })
+
+    try:
+        while True:
+            frame = await websocket.receive_bytes()
+            try:
+                records = decode_records(frame)
+            except ValueError as e:
+                await websocket.send_json({"error": str(e)})
+                continue
+
+            # Skip anything already acknowledged (e.g. resent after a reconnect)
+            acked = last_acked_seq.get(device_id, 0)
+            rows = [
+                {"device_id": device_id, "timestamp": ts, "energy_watts": watts}
+                for seq, ts, watts in records
+                if seq > acked
+            ]
+            if len(rows) > max_records_per_frame:
+                # Could never fit in the device's bucket; backing off would not help
+                await websocket.send_json({
+                    "ack": acked,
+                    "error": f"Frame has {len(rows)} new records, at most {max_records_per_frame} "
+                             f"are accepted per frame. Split it into smaller frames.",
+                    "max_records_per_frame": max_records_per_frame,
+                })
+                continue
+            if rows:
+                retry_after = await check_device_rate_limit(device_id, len(rows))
+                if retry_after:
+                    # Nothing is acked, so the device resends these records after backing off
+                    await websocket.send_json({"ack": acked, "retry_after": retry_after})
+                    continue
+                async with AsyncSession(engine, expire_on_commit=False) as session:
+                    await insert_telemetry_rows(session, rows)
+                acked = max(acked, max(seq for seq, _, _ in records))
+                last_acked_seq[device_id] = acked
+            await websocket.send_json({"ack": acked})
+    except WebSocketDisconnect:
+        pass
+
+
+@router.post("/import", dependencies=[shed_load(PRIORITY_ANALYTICS), Depends(limit_user_queries)])
+async def import_telemetry(
+    request: Request,
+    current_user: CurrentUserClaims,
+    session: DBSession,
+    format: Literal["csv", "ndjson"] = "csv",
+    offset: int = 0,
+):
+    """
+    Bulk import historical telemetry from a CSV (`device_id,timestamp,energy_watts`) or NDJSON upload.
+    The request body is streamed, validated in chunks and loaded with COPY into a staging table,
+    then merged into telemetry ignoring duplicates. To resume an interrupted upload, resend the
+    file from `committed_offset` and pass it as `offset`.
+    """
+    devices_result = await session.exec(select(Device.id).where(Device.user_id == current_user.user_id))
+    allowed_device_ids = set(devices_result.all())
+    await session.close()
+
+    try:
+        return await import_telemetry_stream(request.stream(), format, allowed_device_ids, start_offset=offset)
+    except TelemetryImportError as e:
+        raise HTTPException(status_code=422, detail={
+            "message": str(e),
+            "committed_offset": e.committed_offset,
+            "rows_inserted": e.rows_inserted,
+        })
+    finally:
+        # Imported history may fall in billing periods whose cost is cached
+        cost_cache.invalidate_user(current_user.user_id)
+
+
 @router.get("/devices", response_model=List[DevicePublic])
 async def get_devices(current_user: CurrentUserClaims, session: DBSession):
     """
@@ -123,7 +293,8 @@ async def get_devices_with_product_details(current_user: CurrentUserClaims, sess
         .join(Product, Device.product_id == Product.id)
         .where(Device.user_id == current_user.user_id)
     )
-    results = await session.exec(query)
+    with span("db"):
+        results = await session.exec(query)
     device_details = [
         {'id': str(res.id), 'name': res.name, 'type': res.type}
         for res in results.all()
@@ -131,27 +302,66 @@ async def get_devices_with_product_details(current_user: CurrentUserClaims, sess
     return device_details
 
 
-@router.post("/query")
-async def execute_sql_query(
-    query_request: QueryRequest,
-    current_user: CurrentUserClaims,
+@router.websocket("/stream")
+async def stream_telemetry(
+    websocket: WebSocket,
     session: DBSession,
+    token: str = Query(...),
+    device_id: Annotated[List[uuid.UUID] | None, Query()] = None,
 ):
     """
-    Executes a read-only SQL query against the telemetry data for the current user.
-    The query must be a SELECT statement.
+    Push newly ingested readings for the current user's devices over a WebSocket.
+    Browsers can't set an Authorization header on WebSockets, so the JWT is passed as `token`.
+    Optionally restrict the stream to specific devices with repeated `device_id` params.
     """
-    query = query_request.query
+    try:
+        current_user = decode_user_claims(token)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+
+    # Only subscribe to devices owned by the user
+    query = select(Device.id).where(Device.user_id == current_user.user_id)
+    if device_id:
+        query = query.where(Device.id.in_(device_id))
+    owned_device_ids = (await session.exec(query)).all()
+    # Release the DB connection; it is not needed while the socket is open
+    await session.close()
+
+    await websocket.accept()
+    subscription = broker.subscribe(owned_device_ids)
+
+    async def forward_readings():
+        while True:
+            message = await subscription.get()
+            await websocket.send_json(message)
+
+    sender = asyncio.create_task(forward_readings())
+    try:
+        # Clients don't send anything; receiving just lets us notice disconnects while idle
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        broker.unsubscribe(subscription)
+
+
+async def run_read_only_query(session: AsyncSession, query: str) -> dict:
+    """Run a read-only SELECT and return its columns and JSON-serializable rows."""
     if not is_read_only_query(query):
         raise HTTPException(status_code=400, detail="Only read-only SELECT queries are allowed.")
 
     try:
-        results = await session.exec(text(query))
+        with span("db"):
+            results = await session.exec(text(query))
+            rows = results.all()
         column_names = list(results.keys())
         
         # Convert results to list of dictionaries with JSON-serializable values
         results_list = []
-        for row in results.all():
+        for row in rows:
             row_dict = {}
             for i, value in enumerate(row):
                 if hasattr(value, '__str__') and not isinstance(value, (str, int, float, bool, type(None))):
@@ -168,7 +378,62 @@ async def execute_sql_query(
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
 
 
-@router.get("/summary", response_model=List[DeviceEnergySummary])
+@router.post("/query", dependencies=[shed_load(PRIORITY_ANALYTICS), Depends(limit_user_queries)])
+async def execute_sql_query(
+    query_request: QueryRequest,
+    current_user: CurrentUserClaims,
+    session: DBSession,
+):
+    """
+    Executes a read-only SQL query against the telemetry data for the current user.
+    The query must be a SELECT statement.
+    """
+    return await run_read_only_query(session, query_request.query)
+
+
+@router.post("/query/batch", dependencies=[shed_load(PRIORITY_ANALYTICS)])
+async def execute_sql_query_batch(
+    batch_request: BatchQueryRequest,
+    current_user: CurrentUserClaims,
+    session: DBSession,
+):
+    """
+    Executes several read-only SQL queries one after another on a single connection, in one round trip.
+    Returns one entry per query, in order: its columns and rows, or its `error` and `status_code`.
+    Each query costs one token from the user's batch query bucket.
+    """
+    max_queries = min(settings.QUERY_BATCH_MAX_QUERIES, int(settings.RATE_LIMIT_QUERY_BATCH_BURST))
+    if len(batch_request.queries) > max_queries:
+        raise HTTPException(status_code=400, detail=f"At most {max_queries} queries per batch.")
+    await limit_user_batch_queries(current_user, len(batch_request.queries))
+
+    responses = []
+    for query in batch_request.queries:
+        try:
+            responses.append(await run_read_only_query(session, query))
+        except HTTPException as e:
+            # A failed statement aborts the transaction; roll back so the next query can run
+            await session.rollback()
+            responses.append({"error": e.detail, "status_code": e.status_code})
+    return responses
+
+
+def user_telemetry_query(user_id: int, start: datetime, end: datetime, *columns, end_inclusive: bool = True):
+    """Select `columns` from the telemetry of the user's devices, joined with the devices, within start..end."""
+    return (
+        select(*columns)
+        .join(Telemetry, Device.id == Telemetry.device_id)
+        .where(
+            and_(
+                Device.user_id == user_id,
+                Telemetry.timestamp >= start,
+                Telemetry.timestamp <= end if end_inclusive else Telemetry.timestamp < end,
+            )
+        )
+    )
+
+
+@router.get("/summary", response_model=List[DeviceEnergySummary], dependencies=[shed_load(PRIORITY_READ)])
 async def get_energy_summary(
     start: datetime,
     end: datetime,
@@ -189,22 +454,12 @@ async def get_energy_summary(
 
     # 2. Calculate the average power (watts) and multiply by the actual duration.
     # Energy (kWh) = Avg Power (W) * Duration (h) / 1000 W/kW
-    query = (
-        select(
-            Device.id,
-            Device.name,
-            ((func.avg(Telemetry.energy_watts) * duration_hours) / 1000).label("total_kwh"),
-        )
-        .join(Telemetry, Device.id == Telemetry.device_id)
-        .where(
-            and_(
-                Device.user_id == current_user.user_id,
-                Telemetry.timestamp >= start,
-                Telemetry.timestamp <= end,
-            )
-        )
-        .group_by(Device.id, Device.name)
-    )
+    query = user_telemetry_query(
+        current_user.user_id, start, end,
+        Device.id,
+        Device.name,
+        ((func.avg(Telemetry.energy_watts) * duration_hours) / 1000).label("total_kwh"),
+    ).group_by(Device.id, Device.name)
 
     
     result = await session.exec(query)
@@ -221,7 +476,166 @@ async def get_energy_summary(
     ]
 
 
-@router.get("/devices/{device_id}", response_model=List[TelemetryBucket])
+@router.get("/tariff", response_model=TariffSchedule)
+async def get_tariff(current_user: CurrentUserClaims, session: DBSession):
+    """Get the current user's time-of-use tariff."""
+    found = await get_tariff_schedule(session, current_user.user_id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="No tariff configured.")
+    return found[1]
+
+
+@router.put("/tariff", response_model=TariffSchedule)
+async def put_tariff(schedule: TariffSchedule, current_user: CurrentUserClaims, session: DBSession):
+    """
+    Set the current user's time-of-use tariff: a default price per kWh, overridden by `rates` for
+    the given weekdays (0 = Monday) and local hours [start_hour, end_hour) in `timezone`.
+    Rates later in the list override earlier ones where they overlap.
+    """
+    await save_tariff_schedule(session, current_user.user_id, schedule)
+    return schedule
+
+
+@router.get("/cost", response_model=EnergyCost, dependencies=[shed_load(PRIORITY_READ)])
+async def get_energy_cost(
+    start: datetime,
+    end: datetime,
+    current_user: CurrentUserClaims,
+    session: DBSession,
+):
+    """
+    Get the cost of the energy used by the current user's devices in [start, end), priced hourly
+    with the user's time-of-use tariff, per device and per tariff period. Costs of closed billing
+    periods are cached.
+    """
+    if start.tzinfo is None or end.tzinfo is None:
+        raise HTTPException(status_code=400, detail="start and end must include a time zone offset.")
+    if end <= start or end - start > timedelta(days=settings.COST_MAX_RANGE_DAYS):
+        raise HTTPException(
+            status_code=400, detail=f"end must be after start, within {settings.COST_MAX_RANGE_DAYS} days."
+        )
+
+    found = await get_tariff_schedule(session, current_user.user_id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="No tariff configured.")
+    tariff, schedule = found
+
+    cached = cost_cache.get(current_user.user_id, start, end, tariff.updated_at)
+    if cached is not None:
+        return cached
+
+    # Hourly average power per device; pricing happens in NumPy rather than per reading.
+    # Buckets start on local hours, which in zones like Asia/Kolkata are at :30 UTC.
+    offset_minutes = bucket_offset_minutes(schedule.timezone, start)
+    bucket = func.time_bucket(
+        literal_column("'1 hour'"), Telemetry.timestamp, literal_column(f"'{offset_minutes} minutes'::interval")
+    ).label("bucket")
+    query = user_telemetry_query(
+        current_user.user_id, start, end,
+        Device.id,
+        Device.name,
+        bucket,
+        func.avg(Telemetry.energy_watts).label("avg_watts"),
+        end_inclusive=False,
+    ).group_by(Device.id, Device.name, "bucket")
+    with span("db"):
+        result = await session.exec(query)
+        rows = result.all()
+
+    cost = compute_costs(rows, schedule, start, end)
+    cost_cache.store(current_user.user_id, start, end, tariff.updated_at, cost)
+    return cost
+
+
+@router.get("/devices/{device_id}/stats", response_model=DeviceStats, dependencies=[shed_load(PRIORITY_READ)])
+async def get_device_stats(
+    device_id: uuid.UUID,
+    current_user: CurrentUserClaims,
+    session: DBSession,
+    sigma: float | None = None,
+):
+    """
+    Get rolling statistics for a device, maintained incrementally at ingest time.
+    `is_anomaly` flags the latest reading if it was beyond `sigma` standard deviations
+    (default `ANOMALY_SIGMA`) of the device's mean before it arrived.
+    """
+    device_result = await session.exec(
+        select(Device.id).where(Device.id == device_id, Device.user_id == current_user.user_id)
+    )
+    if not device_result.first():
+        raise HTTPException(status_code=404, detail="Device not found or access denied.")
+
+    stats = stats_registry.get(device_id)
+    if stats is None or stats.count == 0:
+        raise HTTPException(status_code=404, detail="No readings received for this device yet.")
+
+    checkpoint = stats.to_checkpoint(device_id)
+    return DeviceStats(
+        device_id=device_id,
+        count=checkpoint["count"],
+        mean_watts=checkpoint["mean"],
+        std_watts=stats.variance ** 0.5,
+        ewma_watts=checkpoint["ewma"],
+        window_size=stats.window_size,
+        window_min_watts=checkpoint["window_min"],
+        window_max_watts=checkpoint["window_max"],
+        last_watts=checkpoint["last_value"],
+        last_seen=checkpoint["last_seen"],
+        last_zscore=checkpoint["last_zscore"],
+        is_anomaly=stats.is_anomaly(sigma if sigma is not None else settings.ANOMALY_SIGMA),
+    )
+
+
+@router.get("/devices/{device_id}/export", dependencies=[shed_load(PRIORITY_ANALYTICS), Depends(limit_user_queries)])
+async def export_device_telemetry(
+    device_id: uuid.UUID,
+    current_user: CurrentUserClaims,
+    session: DBSession,
+    start: datetime,
+    end: datetime,
+    format: Literal["csv", "parquet"] = "csv",
+    compress: bool = True,
+):
+    """
+    Export a device's raw readings between `start` and `end`, streamed so memory stays flat
+    regardless of the range. `csv` comes straight from Postgres COPY (gzipped unless `compress=false`);
+    `parquet` is written one row group at a time.
+    """
+    # Same ownership check as get_device_telemetry
+    device_result = await session.exec(
+        select(Device).where(Device.id == device_id, Device.user_id == current_user.user_id)
+    )
+    if not device_result.first():
+        raise HTTPException(status_code=404, detail="Device not found or access denied.")
+    # The export uses its own connection; don't hold this one for the whole download
+    await session.close()
+
+    filename = f"{device_id}_{start:%Y%m%d}_{end:%Y%m%d}"
+    if format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=501, detail="Parquet export requires pyarrow to be installed.")
+        return StreamingResponse(
+            stream_parquet_export(device_id, start, end),
+            media_type="application/vnd.apache.parquet",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.parquet"'},
+        )
+
+    if compress:
+        filename += ".csv.gz"
+        media_type = "application/gzip"
+    else:
+        filename += ".csv"
+        media_type = "text/csv"
+    return StreamingResponse(
+        stream_csv_export(device_id, start, end, compress=compress),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/devices/{device_id}", response_model=List[TelemetryBucket], dependencies=[shed_load(PRIORITY_READ)])
 async def get_device_telemetry(
     device_id: uuid.UUID,
     current_user: CurrentUserClaims,
@@ -4,7 +4,8 @@ from typing import Optional, List
 
 from sqlmodel import Field, SQLModel, Relationship
 from sqlalchemy import Table, Column, Integer, DateTime
-from pydantic import BaseModel
+from pydantic import BaseModel, Field as PydanticField, field_validator
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 # Forward reference for relationships
 class Device:
@@ -41,6 +42,41 @@ class Telemetry(SQLModel, table=True):
     device_id: uuid.UUID = Field(foreign_key="device.id", primary_key=True)
     energy_watts: float
 
+class DeviceStatsCheckpoint(SQLModel, table=True):
+    __tablename__ = "device_stats"
+
+    device_id: uuid.UUID = Field(foreign_key="device.id", primary_key=True)
+    count: int
+    mean: float
+    m2: float
+    ewma: float
+    last_value: Optional[float] = None
+    last_zscore: float = 0.0
+    window_min: Optional[float] = None
+    window_max: Optional[float] = None
+    last_seen: datetime = Field(sa_column=Column(DateTime(timezone=True), nullable=False))
+
+class Tariff(SQLModel, table=True):
+    """A user's time-of-use tariff: a default price, overridden by the rates in tariff_rate."""
+    user_id: int = Field(foreign_key="user.id", primary_key=True)
+    timezone: str = Field(default="UTC", max_length=64)
+    currency: str = Field(default="USD", max_length=3)
+    default_price_per_kwh: float
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc),
+                                 sa_column=Column(DateTime(timezone=True), nullable=False))
+
+class TariffRate(SQLModel, table=True):
+    __tablename__ = "tariff_rate"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    position: int                  # rates later in the schedule override earlier ones
+    name: str = Field(max_length=50)
+    weekdays: int = 0b1111111      # bitmask, bit 0 = Monday
+    start_hour: int                # local time, inclusive
+    end_hour: int                  # local time, exclusive; wraps past midnight if <= start_hour
+    price_per_kwh: float
+
 # Pydantic models for API data validation
 class TelemetryData(BaseModel):
     device_id: uuid.UUID
@@ -64,4 +100,75 @@ class TelemetryBucket(BaseModel):
     avg_watts: float
 
 class QueryRequest(BaseModel):
-    query: str
\ No newline at end of file
+    query: str
+
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+
+class DeviceStats(BaseModel):
+    device_id: uuid.UUID
+    count: int
+    mean_watts: float
+    std_watts: float
+    ewma_watts: float
+    window_size: int
+    window_min_watts: Optional[float] = None
+    window_max_watts: Optional[float] = None
+    last_watts: Optional[float] = None
+    last_seen: Optional[datetime] = None
+    last_zscore: float
+    is_anomaly: bool
+
+class TariffRatePeriod(BaseModel):
+    name: str = PydanticField(max_length=50)
+    weekdays: List[int] = PydanticField(default=[0, 1, 2, 3, 4, 5, 6], min_length=1)  # 0 = Monday
+    start_hour: int = PydanticField(ge=0, le=23)
+    end_hour: int = PydanticField(ge=0, le=24)
+    price_per_kwh: float = PydanticField(ge=0)
+
+    @field_validator("weekdays")
+    @classmethod
+    def check_weekdays(cls, weekdays: List[int]) -> List[int]:
+        if any(day < 0 or day > 6 for day in weekdays):
+            raise ValueError("weekdays must be between 0 (Monday) and 6 (Sunday)")
+        return weekdays
+
+class TariffSchedule(BaseModel):
+    timezone: str = "UTC"
+    currency: str = PydanticField(default="USD", min_length=3, max_length=3)
+    default_price_per_kwh: float = PydanticField(ge=0)
+    rates: List[TariffRatePeriod] = []
+
+    @field_validator("currency")
+    @classmethod
+    def normalize_currency(cls, currency: str) -> str:
+        return currency.upper()
+
+    @field_validator("timezone")
+    @classmethod
+    def check_timezone(cls, tz: str) -> str:
+        try:
+            ZoneInfo(tz)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f"Unknown time zone: {tz}")
+        return tz
+
+class DeviceCost(BaseModel):
+    device_id: uuid.UUID
+    device_name: str
+    total_kwh: float
+    cost: float
+
+class PeriodCost(BaseModel):
+    name: str
+    total_kwh: float
+    cost: float
+
+class EnergyCost(BaseModel):
+    start: datetime
+    end: datetime
+    currency: str
+    total_kwh: float
+    total_cost: float
+    devices: List[DeviceCost]
+    periods: List[PeriodCost]
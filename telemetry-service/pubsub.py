@@ -0,0 +1,64 @@
+import asyncio
+import uuid
+from typing import Dict, Iterable, Set
+
+
+class Subscription:
+    """A single live subscriber. Holds a bounded queue of pending readings.
+
+    When the consumer falls behind, the oldest queued reading is dropped so a slow
+    client never blocks ingestion or grows memory without bound.
+    """
+
+    def __init__(self, device_ids: Iterable[uuid.UUID], max_queue_size: int = 100):
+        self.device_ids: Set[uuid.UUID] = set(device_ids)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self.dropped = 0
+
+    def put(self, message: dict):
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(message)
+
+    async def get(self) -> dict:
+        return await self.queue.get()
+
+
+class TelemetryBroker:
+    """In-process fan-out of newly ingested readings to live subscribers.
+
+    Subscribers are indexed by device id, so publishing a reading for a device nobody
+    is watching is a single dict lookup.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[uuid.UUID, Set[Subscription]] = {}
+
+    def subscribe(self, device_ids: Iterable[uuid.UUID], max_queue_size: int = 100) -> Subscription:
+        subscription = Subscription(device_ids, max_queue_size=max_queue_size)
+        for device_id in subscription.device_ids:
+            self._subscribers.setdefault(device_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for device_id in subscription.device_ids:
+            subscribers = self._subscribers.get(device_id)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[device_id]
+
+    def publish(self, device_id: uuid.UUID, message: dict):
+        subscribers = self._subscribers.get(device_id)
+        if not subscribers:
+            return
+        for subscription in subscribers:
+            subscription.put(message)
+
+
+broker = TelemetryBroker()
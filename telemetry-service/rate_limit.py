@@ -0,0 +1,156 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from fastapi import HTTPException, status
+
+# Priority classes. Under load, higher numbers are shed first; ingest is never shed.
+PRIORITY_INGEST = 0
+PRIORITY_READ = 1
+PRIORITY_ANALYTICS = 2
+
+# Retry-After sent with load-shedding rejections
+SHED_RETRY_AFTER_SECONDS = 2
+
+
+def too_many_requests(retry_after: float, detail: str = "Rate limit exceeded.") -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+def check_cost(cost: float, capacity: float):
+    """A bucket never holds more than `capacity` tokens, so a larger cost could never be admitted."""
+    if cost > capacity:
+        raise ValueError(f"Cost {cost} exceeds the bucket capacity {capacity}.")
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, capacity: float, now: float):
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, rate: float, capacity: float, cost: float, now: float) -> float:
+        """Refill, then try to take `cost` tokens. Returns 0 on success, else seconds until enough tokens."""
+        self.tokens = min(capacity, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / rate
+
+
+class InMemoryRateLimiter:
+    """Per-process token buckets, keeping at most `max_keys` of the most recently used keys."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    async def take(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> float:
+        check_cost(cost, capacity)
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(capacity, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket.take(rate, capacity, cost, now)
+
+
+# Atomic refill-and-take, using the Redis clock so all replicas agree on time
+_REDIS_TOKEN_BUCKET = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(retry_after)
+"""
+
+
+class RedisRateLimiter:
+    """Token buckets shared across replicas through Redis. Requires the optional `redis` package."""
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        import redis.asyncio as redis
+
+        self.prefix = prefix
+        self._client = redis.from_url(url)
+        self._script = self._client.register_script(_REDIS_TOKEN_BUCKET)
+
+    async def take(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> float:
+        check_cost(cost, capacity)
+        retry_after = await self._script(keys=[self.prefix + key], args=[rate, capacity, cost])
+        return float(retry_after)
+
+
+def create_rate_limiter(redis_url: Optional[str] = None):
+    if redis_url:
+        print("Rate limiting with shared Redis buckets.")
+        return RedisRateLimiter(redis_url)
+    return InMemoryRateLimiter()
+
+
+class LoadMonitor:
+    """
+    Tracks event-loop lag (and optionally connection pool utilization) to decide when to shed load.
+    Overload is the worst of the signals relative to their thresholds: at 1x analytics requests
+    are shed, at 2x ordinary reads are shed too. Ingest is never shed.
+    """
+
+    def __init__(
+        self,
+        max_loop_lag_ms: float,
+        max_pool_utilization: float = 1.0,
+        pool_utilization: Optional[Callable[[], float]] = None,
+        interval_seconds: float = 0.1,
+    ):
+        self.max_loop_lag_ms = max_loop_lag_ms
+        self.max_pool_utilization = max_pool_utilization
+        self.pool_utilization = pool_utilization
+        self.interval_seconds = interval_seconds
+        self.loop_lag_ms = 0.0
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time()
+            await asyncio.sleep(self.interval_seconds)
+            lag_ms = max(0.0, (loop.time() - scheduled - self.interval_seconds) * 1000)
+            # Smooth out one-off spikes
+            self.loop_lag_ms = 0.7 * self.loop_lag_ms + 0.3 * lag_ms
+
+    def overload(self) -> float:
+        overload = self.loop_lag_ms / self.max_loop_lag_ms
+        if self.pool_utilization is not None:
+            overload = max(overload, self.pool_utilization() / self.max_pool_utilization)
+        return overload
+
+    def should_shed(self, priority: int) -> bool:
+        if priority == PRIORITY_INGEST:
+            return False
+        overload = self.overload()
+        if priority >= PRIORITY_ANALYTICS:
+            return overload >= 1.0
+        return overload >= 2.0
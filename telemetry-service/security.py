@@ -13,13 +13,17 @@ class UserClaims(BaseModel):
     role: str | None = None
 
 def get_current_user(token: str = Depends(security)) -> UserClaims:
+    return decode_user_claims(token.credentials)
+
+def decode_user_claims(token: str) -> UserClaims:
+    """Validate a raw JWT string. Used directly by endpoints that can't send an Authorization header (e.g. WebSockets)."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token.credentials, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
+        payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
         user_id_str: str = payload.get("sub")
         email: str = payload.get("email")
         role: str = payload.get("role")
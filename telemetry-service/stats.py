@@ -0,0 +1,180 @@
+import asyncio
+import math
+import uuid
+from array import array
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, Optional, Set
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from config import settings
+from database import engine
+from models import DeviceStatsCheckpoint
+
+# asyncpg allows at most 32767 bind parameters per statement; 10 per checkpoint row
+MAX_CHECKPOINTS_PER_INSERT = 3000
+
+# Slots in each device's stats array
+COUNT, MEAN, M2, EWMA, LAST_VALUE, LAST_SEEN, LAST_ZSCORE = range(7)
+
+
+class DeviceRollingStats:
+    """
+    O(1)-update streaming statistics for one device.
+    Scalar stats (Welford mean/variance, EWMA, last reading) live in a single compact float array.
+    Rolling min/max over the last `window_size` readings use monotonic deques (amortized O(1)).
+    """
+
+    __slots__ = ("values", "window_size", "_index", "_min_window", "_max_window")
+
+    def __init__(self, window_size: int):
+        self.values = array("d", [0.0, 0.0, 0.0, 0.0, math.nan, 0.0, 0.0])
+        self.window_size = window_size
+        self._index = 0
+        self._min_window: deque = deque()
+        self._max_window: deque = deque()
+
+    @property
+    def count(self) -> int:
+        return int(self.values[COUNT])
+
+    @property
+    def variance(self) -> float:
+        count = self.values[COUNT]
+        return self.values[M2] / (count - 1) if count > 1 else 0.0
+
+    @property
+    def window_min(self) -> Optional[float]:
+        return self._min_window[0][1] if self._min_window else None
+
+    @property
+    def window_max(self) -> Optional[float]:
+        return self._max_window[0][1] if self._max_window else None
+
+    def zscore(self, value: float) -> float:
+        std = math.sqrt(self.variance)
+        return (value - self.values[MEAN]) / std if std > 0 else 0.0
+
+    def update(self, value: float, timestamp: datetime, ewma_alpha: float):
+        v = self.values
+        # Score the reading against history before it is folded in
+        v[LAST_ZSCORE] = self.zscore(value)
+
+        # Welford's online mean/variance
+        v[COUNT] += 1
+        delta = value - v[MEAN]
+        v[MEAN] += delta / v[COUNT]
+        v[M2] += delta * (value - v[MEAN])
+
+        v[EWMA] = value if v[COUNT] == 1 else ewma_alpha * value + (1 - ewma_alpha) * v[EWMA]
+        v[LAST_VALUE] = value
+        v[LAST_SEEN] = max(v[LAST_SEEN], timestamp.timestamp())
+
+        # Rolling min/max: drop entries that fell out of the window or can never win again
+        self._index += 1
+        expired = self._index - self.window_size
+        while self._min_window and self._min_window[-1][1] >= value:
+            self._min_window.pop()
+        self._min_window.append((self._index, value))
+        while self._min_window[0][0] <= expired:
+            self._min_window.popleft()
+        while self._max_window and self._max_window[-1][1] <= value:
+            self._max_window.pop()
+        self._max_window.append((self._index, value))
+        while self._max_window[0][0] <= expired:
+            self._max_window.popleft()
+
+    def is_anomaly(self, sigma: float) -> bool:
+        return self.count > settings.ANOMALY_MIN_SAMPLES and abs(self.values[LAST_ZSCORE]) > sigma
+
+    def to_checkpoint(self, device_id: uuid.UUID) -> dict:
+        v = self.values
+        return {
+            "device_id": device_id,
+            "count": self.count,
+            "mean": v[MEAN],
+            "m2": v[M2],
+            "ewma": v[EWMA],
+            "last_value": None if math.isnan(v[LAST_VALUE]) else v[LAST_VALUE],
+            "last_zscore": v[LAST_ZSCORE],
+            "window_min": self.window_min,
+            "window_max": self.window_max,
+            "last_seen": datetime.fromtimestamp(v[LAST_SEEN], tz=timezone.utc),
+        }
+
+    @classmethod
+    def from_checkpoint(cls, checkpoint: DeviceStatsCheckpoint, window_size: int) -> "DeviceRollingStats":
+        stats = cls(window_size)
+        v = stats.values
+        v[COUNT] = checkpoint.count
+        v[MEAN] = checkpoint.mean
+        v[M2] = checkpoint.m2
+        v[EWMA] = checkpoint.ewma
+        v[LAST_VALUE] = checkpoint.last_value if checkpoint.last_value is not None else math.nan
+        v[LAST_SEEN] = checkpoint.last_seen.timestamp()
+        v[LAST_ZSCORE] = checkpoint.last_zscore
+        # The rolling window itself isn't persisted; seed it with the checkpointed extremes
+        if checkpoint.window_min is not None:
+            stats._min_window.append((0, checkpoint.window_min))
+        if checkpoint.window_max is not None:
+            stats._max_window.append((0, checkpoint.window_max))
+        return stats
+
+
+class StatsRegistry:
+    """Rolling stats for every device seen by this process, checkpointed to the device_stats table."""
+
+    def __init__(self):
+        self.devices: Dict[uuid.UUID, DeviceRollingStats] = {}
+        self._dirty: Set[uuid.UUID] = set()
+
+    def update(self, device_id: uuid.UUID, value: float, timestamp: datetime) -> DeviceRollingStats:
+        stats = self.devices.get(device_id)
+        if stats is None:
+            stats = self.devices[device_id] = DeviceRollingStats(settings.STATS_WINDOW_SIZE)
+        stats.update(value, timestamp, settings.STATS_EWMA_ALPHA)
+        self._dirty.add(device_id)
+        return stats
+
+    def get(self, device_id: uuid.UUID) -> Optional[DeviceRollingStats]:
+        return self.devices.get(device_id)
+
+    async def load(self):
+        async with AsyncSession(engine) as session:
+            result = await session.exec(select(DeviceStatsCheckpoint))
+            for checkpoint in result.all():
+                self.devices[checkpoint.device_id] = DeviceRollingStats.from_checkpoint(
+                    checkpoint, settings.STATS_WINDOW_SIZE
+                )
+
+    async def checkpoint(self):
+        """Upsert stats for devices that changed since the last checkpoint."""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        rows = [self.devices[device_id].to_checkpoint(device_id) for device_id in dirty]
+        try:
+            async with AsyncSession(engine) as session:
+                for start in range(0, len(rows), MAX_CHECKPOINTS_PER_INSERT):
+                    stmt = pg_insert(DeviceStatsCheckpoint).values(rows[start:start + MAX_CHECKPOINTS_PER_INSERT])
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=["device_id"],
+                        set_={column: stmt.excluded[column] for column in rows[0] if column != "device_id"},
+                    )
+                    await session.execute(stmt)
+                await session.commit()
+        except Exception as e:
+            # Retry these devices on the next checkpoint
+            self._dirty |= dirty
+            print(f"Device stats checkpoint failed: {e}")
+
+    async def run_checkpoints(self):
+        while True:
+            await asyncio.sleep(settings.STATS_CHECKPOINT_SECONDS)
+            await self.checkpoint()
+
+
+registry = StatsRegistry()
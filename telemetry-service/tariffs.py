@@ -0,0 +1,210 @@
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models import Tariff, TariffRate, TariffRatePeriod, TariffSchedule, EnergyCost, DeviceCost, PeriodCost
+
+DEFAULT_PERIOD = "default"
+
+HOUR = timedelta(hours=1)
+
+
+def weekdays_to_mask(weekdays: Sequence[int]) -> int:
+    return sum(1 << day for day in set(weekdays))
+
+
+def mask_to_weekdays(mask: int) -> List[int]:
+    return [day for day in range(7) if mask & (1 << day)]
+
+
+async def get_tariff_schedule(session: AsyncSession, user_id: int) -> Optional[Tuple[Tariff, TariffSchedule]]:
+    tariff = await session.get(Tariff, user_id)
+    if tariff is None:
+        return None
+    rates = await session.exec(
+        select(TariffRate).where(TariffRate.user_id == user_id).order_by(TariffRate.position)
+    )
+    schedule = TariffSchedule(
+        timezone=tariff.timezone,
+        currency=tariff.currency,
+        default_price_per_kwh=tariff.default_price_per_kwh,
+        rates=[
+            TariffRatePeriod(
+                name=rate.name,
+                weekdays=mask_to_weekdays(rate.weekdays),
+                start_hour=rate.start_hour,
+                end_hour=rate.end_hour,
+                price_per_kwh=rate.price_per_kwh,
+            )
+            for rate in rates.all()
+        ],
+    )
+    return tariff, schedule
+
+
+async def save_tariff_schedule(session: AsyncSession, user_id: int, schedule: TariffSchedule) -> Tariff:
+    """Replace the user's tariff and rates."""
+    tariff = await session.get(Tariff, user_id)
+    if tariff is None:
+        tariff = Tariff(user_id=user_id, default_price_per_kwh=schedule.default_price_per_kwh)
+    tariff.timezone = schedule.timezone
+    tariff.currency = schedule.currency
+    tariff.default_price_per_kwh = schedule.default_price_per_kwh
+    tariff.updated_at = datetime.now(timezone.utc)
+    session.add(tariff)
+
+    old_rates = await session.exec(select(TariffRate).where(TariffRate.user_id == user_id))
+    for rate in old_rates.all():
+        await session.delete(rate)
+    for position, rate in enumerate(schedule.rates):
+        session.add(TariffRate(
+            user_id=user_id,
+            position=position,
+            name=rate.name,
+            weekdays=weekdays_to_mask(rate.weekdays),
+            start_hour=rate.start_hour,
+            end_hour=rate.end_hour,
+            price_per_kwh=rate.price_per_kwh,
+        ))
+    await session.commit()
+    await session.refresh(tariff)
+    return tariff
+
+
+def build_rate_table(schedule: TariffSchedule) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """
+    Expand the schedule into (weekday x local hour) lookup tables: the price per kWh, and the index
+    of the named period it belongs to. Later rates override earlier ones where they overlap.
+    """
+    periods = [DEFAULT_PERIOD]
+    prices = np.full((7, 24), schedule.default_price_per_kwh)
+    period_index = np.zeros((7, 24), dtype=np.intp)
+    for rate in schedule.rates:
+        if rate.name not in periods:
+            periods.append(rate.name)
+        if rate.start_hour < rate.end_hour:
+            hours = np.arange(rate.start_hour, rate.end_hour)
+        else:
+            hours = np.r_[rate.start_hour:24, 0:rate.end_hour]
+        cells = np.ix_(rate.weekdays, hours)
+        prices[cells] = rate.price_per_kwh
+        period_index[cells] = periods.index(rate.name)
+    return prices, period_index, periods
+
+
+def bucket_offset_minutes(timezone_name: str, at: datetime) -> int:
+    """
+    Minutes past the UTC hour at which local hours start in the zone, e.g. 30 for Asia/Kolkata (+5:30).
+    Hourly buckets shifted by this line up with local hours, so each is priced with a single rate.
+    Buckets are still whole elapsed hours, so the repeated hour when clocks go back isn't merged.
+    """
+    offset = at.astimezone(ZoneInfo(timezone_name)).utcoffset()
+    return int(offset.total_seconds() // 60) % 60
+
+
+def compute_costs(
+    rows: Sequence,
+    schedule: TariffSchedule,
+    start: datetime,
+    end: datetime,
+) -> EnergyCost:
+    """
+    Price hourly energy with the schedule. `rows` are (device id, device name, hour bucket, avg watts),
+    averaged over readings in [start, end), with buckets aligned to local hours (see bucket_offset_minutes). Energy is laid out as a (device x hour) array and priced in
+    one vectorized pass; only the distinct hours are converted to local time, to look up their weekday
+    and hour in the rate table. Buckets cut off by start or end count only the part of the hour covered.
+    """
+    prices, period_index, periods = build_rate_table(schedule)
+
+    device_ids: Dict[uuid.UUID, int] = {}
+    device_names: List[str] = []
+    hours: Dict[datetime, int] = {}
+    row_device = np.empty(len(rows), dtype=np.intp)
+    row_hour = np.empty(len(rows), dtype=np.intp)
+    row_kwh = np.empty(len(rows))
+    for i, (device_id, device_name, bucket, avg_watts) in enumerate(rows):
+        if device_id not in device_ids:
+            device_ids[device_id] = len(device_names)
+            device_names.append(device_name)
+        row_device[i] = device_ids[device_id]
+        row_hour[i] = hours.setdefault(bucket, len(hours))
+        # Average power over the hour x 1 h; hours without readings count as zero
+        row_kwh[i] = (avg_watts or 0.0) / 1000
+
+    energy = np.zeros((len(device_ids), len(hours)))
+    energy[row_device, row_hour] = row_kwh
+    energy *= np.fromiter(
+        ((min(bucket + HOUR, end) - max(bucket, start)) / HOUR for bucket in hours), dtype=float, count=len(hours)
+    )
+
+    tz = ZoneInfo(schedule.timezone)
+    local_hours = [bucket.astimezone(tz) for bucket in hours]
+    weekday = np.fromiter((h.weekday() for h in local_hours), dtype=np.intp, count=len(hours))
+    hour_of_day = np.fromiter((h.hour for h in local_hours), dtype=np.intp, count=len(hours))
+    hourly_price = prices[weekday, hour_of_day]
+    hourly_period = period_index[weekday, hour_of_day]
+
+    cost = energy * hourly_price
+    device_kwh = energy.sum(axis=1)
+    device_cost = cost.sum(axis=1)
+    period_kwh = np.bincount(hourly_period, weights=energy.sum(axis=0), minlength=len(periods))
+    period_cost = np.bincount(hourly_period, weights=cost.sum(axis=0), minlength=len(periods))
+
+    return EnergyCost(
+        start=start,
+        end=end,
+        currency=schedule.currency,
+        total_kwh=float(device_kwh.sum()),
+        total_cost=float(device_cost.sum()),
+        devices=[
+            DeviceCost(device_id=device_id, device_name=device_names[i],
+                       total_kwh=float(device_kwh[i]), cost=float(device_cost[i]))
+            for device_id, i in device_ids.items()
+        ],
+        periods=[
+            PeriodCost(name=name, total_kwh=float(period_kwh[i]), cost=float(period_cost[i]))
+            for i, name in enumerate(periods)
+        ],
+    )
+
+
+class CostCache:
+    """
+    LRU cache of costs for closed billing periods, which no longer change once their readings
+    have settled. Entries are tied to the tariff version they were priced with.
+    """
+
+    def __init__(self, max_entries: int, settle_seconds: float):
+        self.max_entries = max_entries
+        self.settle = timedelta(seconds=settle_seconds)
+        self._entries: "OrderedDict[Tuple[int, datetime, datetime], Tuple[datetime, EnergyCost]]" = OrderedDict()
+
+    def is_closed(self, end: datetime) -> bool:
+        return end <= datetime.now(timezone.utc) - self.settle
+
+    def get(self, user_id: int, start: datetime, end: datetime, tariff_version: datetime) -> Optional[EnergyCost]:
+        key = (user_id, start, end)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != tariff_version:
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def store(self, user_id: int, start: datetime, end: datetime, tariff_version: datetime, cost: EnergyCost):
+        if self.max_entries <= 0 or not self.is_closed(end):
+            return
+        self._entries[(user_id, start, end)] = (tariff_version, cost)
+        self._entries.move_to_end((user_id, start, end))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int):
+        """Drop a user's entries, e.g. after historical readings were imported."""
+        for key in [key for key in self._entries if key[0] == user_id]:
+            del self._entries[key]
@@ -0,0 +1,12 @@
+import os
+
+# Settings has no defaults for these; the engine is created lazily, so no database is needed
+for name, value in {
+    "DB_HOST": "localhost",
+    "DB_PORT": "5432",
+    "DB_NAME": "telemetry",
+    "DB_USER": "telemetry",
+    "DB_PASSWORD": "telemetry",
+    "JWT_SECRET_KEY": "test-secret",
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,136 @@
+import asyncio
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+import bulk_import
+import import_data
+from bulk_import import TelemetryImportError, import_telemetry_stream, parse_line
+
+DEVICE_ID = uuid.UUID("00000000-0000-0000-0000-000000000001")
+
+
+class FakeConnection:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def get_raw_connection(self):
+        return self
+
+    @property
+    def driver_connection(self):
+        return self
+
+
+class FakeEngine:
+    def connect(self):
+        return FakeConnection()
+
+
+@pytest.fixture
+def copied(monkeypatch):
+    """Records passed to copy_chunk, one list per committed chunk."""
+    chunks = []
+
+    async def copy_chunk(raw_conn, records):
+        chunks.append(list(records))
+        return len(records)
+
+    monkeypatch.setattr(bulk_import, "engine", FakeEngine())
+    monkeypatch.setattr(bulk_import, "copy_chunk", copy_chunk)
+    return chunks
+
+
+async def stream(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+def run_import(body: bytes, format: str = "csv", start_offset: int = 0, split: int = 7) -> dict:
+    chunks = [body[i:i + split] for i in range(0, len(body), split)]
+    return asyncio.run(import_telemetry_stream(stream(*chunks), format, {DEVICE_ID}, start_offset))
+
+
+def csv_line(hour: int, watts: float = 100.0) -> bytes:
+    return f"{DEVICE_ID},2025-01-01T{hour:02d}:00:00+00:00,{watts}\n".encode()
+
+
+def test_parse_csv_line():
+    assert parse_line(csv_line(3, 42.5).strip(), "csv") == (
+        DEVICE_ID, datetime(2025, 1, 1, 3, tzinfo=timezone.utc), 42.5,
+    )
+
+
+def test_parse_ndjson_line_defaults_to_utc():
+    line = b'{"device_id": "%s", "timestamp": "2025-01-01T03:00:00", "energy_watts": 7}' % str(DEVICE_ID).encode()
+    assert parse_line(line, "ndjson") == (DEVICE_ID, datetime(2025, 1, 1, 3, tzinfo=timezone.utc), 7.0)
+
+
+@pytest.mark.parametrize("line", [b"not-a-uuid,2025-01-01T00:00:00,1", b"%s,yesterday,1" % str(DEVICE_ID).encode()])
+def test_parse_line_rejects_bad_values(line):
+    with pytest.raises(ValueError):
+        parse_line(line, "csv")
+
+
+@pytest.mark.parametrize("watts", ["nan", "inf", "-inf", "NaN", "Infinity"])
+def test_parse_line_rejects_non_finite_watts(watts):
+    with pytest.raises(ValueError, match="finite"):
+        parse_line(f"{DEVICE_ID},2025-01-01T00:00:00,{watts}".encode(), "csv")
+    line = f'{{"device_id": "{DEVICE_ID}", "timestamp": "2025-01-01T00:00:00", "energy_watts": "{watts}"}}'
+    with pytest.raises(ValueError, match="finite"):
+        parse_line(line.encode(), "ndjson")
+
+
+def test_offsets_cover_the_whole_body(copied):
+    body = b"device_id,timestamp,energy_watts\n" + b"".join(csv_line(hour) for hour in range(5))
+    result = run_import(body)
+    assert result == {"rows_received": 5, "rows_inserted": 5, "committed_offset": len(body)}
+    assert len(copied[0]) == 5
+
+
+def test_missing_trailing_newline(copied):
+    body = b"".join(csv_line(hour) for hour in range(3)).rstrip(b"\n")
+    assert run_import(body)["committed_offset"] == len(body)
+
+
+def test_resumed_body_starts_at_its_offset(copied):
+    body = b"".join(csv_line(hour) for hour in range(3))
+    # A resumed CSV body has no header, so its first row must not be skipped
+    result = run_import(body, start_offset=1000)
+    assert result["rows_received"] == 3
+    assert result["committed_offset"] == 1000 + len(body)
+
+
+def test_bad_row_reports_the_last_committed_chunk(copied, monkeypatch):
+    monkeypatch.setattr(bulk_import, "IMPORT_CHUNK_ROWS", 2)
+    good = b"".join(csv_line(hour) for hour in range(4))
+    body = good + b"garbage\n" + csv_line(5)
+
+    with pytest.raises(TelemetryImportError) as excinfo:
+        run_import(body, split=len(good))
+    assert excinfo.value.committed_offset == len(good)
+    assert excinfo.value.rows_inserted == 4
+    assert f"byte {len(good)}" in str(excinfo.value)
+
+
+def test_unknown_device_is_rejected(copied):
+    line = f"{uuid.uuid4()},2025-01-01T00:00:00+00:00,1\n".encode()
+    with pytest.raises(TelemetryImportError) as excinfo:
+        run_import(line)
+    assert excinfo.value.committed_offset == 0
+
+
+def test_request_end_is_a_line_boundary(tmp_path):
+    path = tmp_path / "history.csv"
+    path.write_bytes(b"".join(csv_line(hour) for hour in range(10)))
+    size = path.stat().st_size
+    line_length = len(csv_line(0))
+
+    end = import_data.request_end(path, 0, size, request_bytes=line_length + 1)
+    assert end == 2 * line_length
+    assert import_data.request_end(path, end, size, request_bytes=line_length) == 3 * line_length
+    assert import_data.request_end(path, 0, size, request_bytes=size) == size
@@ -0,0 +1,94 @@
+import asyncio
+import gzip
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+import export
+from export import stream_csv_export
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+END = datetime(2025, 1, 2, tzinfo=timezone.utc)
+
+
+class FakeCopyConnection:
+    """Stands in for the engine, its connection and the asyncpg connection, and streams `chunks`."""
+
+    def __init__(self, chunks, error=None):
+        self.chunks = chunks
+        self.error = error
+        self.copying = False
+        self.released_while_copying = None
+
+    def connect(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.released_while_copying = self.copying
+        return False
+
+    async def get_raw_connection(self):
+        return self
+
+    @property
+    def driver_connection(self):
+        return self
+
+    async def copy_from_query(self, query, *args, output, **kwargs):
+        self.copying = True
+        try:
+            for chunk in self.chunks:
+                await output(chunk)
+            if self.error:
+                raise self.error
+        finally:
+            self.copying = False
+
+
+def collect(conn, compress=False, take=None):
+    async def run():
+        chunks = []
+        stream = stream_csv_export(uuid.uuid4(), START, END, compress=compress)
+        async for chunk in stream:
+            chunks.append(chunk)
+            if take is not None and len(chunks) == take:
+                await stream.aclose()
+                break
+        return chunks
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def use_connection(monkeypatch):
+    def install(conn):
+        monkeypatch.setattr(export, "engine", conn)
+        return conn
+    return install
+
+
+def test_streams_every_chunk(use_connection):
+    conn = use_connection(FakeCopyConnection([b"timestamp,energy_watts\n", b"a,1\n", b"b,2\n"]))
+    assert b"".join(collect(conn)) == b"timestamp,energy_watts\na,1\nb,2\n"
+
+
+def test_gzip(use_connection):
+    conn = use_connection(FakeCopyConnection([b"a,1\n"] * 100))
+    assert gzip.decompress(b"".join(collect(conn, compress=True))) == b"a,1\n" * 100
+
+
+def test_copy_error_is_raised(use_connection):
+    conn = use_connection(FakeCopyConnection([b"a,1\n"], error=RuntimeError("connection reset")))
+    with pytest.raises(RuntimeError):
+        collect(conn)
+
+
+def test_disconnect_stops_the_copy_before_releasing_the_connection(use_connection):
+    # More chunks than the queue holds, so the COPY is blocked on a full queue when the client leaves
+    conn = use_connection(FakeCopyConnection([b"a,1\n"] * (export.EXPORT_QUEUE_CHUNKS * 4)))
+    assert len(collect(conn, take=1)) == 1
+    assert conn.released_while_copying is False
@@ -0,0 +1,35 @@
+import math
+from datetime import datetime, timezone
+
+import pytest
+
+from ingest import RECORD_FORMAT, decode_records
+
+
+def frame(*records) -> bytes:
+    return b"".join(RECORD_FORMAT.pack(*record) for record in records)
+
+
+def test_decode_records():
+    ts = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    assert decode_records(frame((1, ts.timestamp(), 100.0), (2, ts.timestamp() + 1, 0.0))) == [
+        (1, ts, 100.0),
+        (2, datetime(2025, 1, 1, 0, 0, 1, tzinfo=timezone.utc), 0.0),
+    ]
+
+
+def test_truncated_frame_is_rejected():
+    with pytest.raises(ValueError):
+        decode_records(frame((1, 0.0, 1.0))[:-1])
+
+
+@pytest.mark.parametrize("ts", [math.inf, -math.inf, math.nan, 1e20, -1e20])
+def test_out_of_range_timestamp_is_rejected(ts):
+    with pytest.raises(ValueError, match="Record 1"):
+        decode_records(frame((1, 0.0, 1.0), (2, ts, 1.0)))
+
+
+@pytest.mark.parametrize("watts", [math.inf, math.nan])
+def test_non_finite_watts_is_rejected(watts):
+    with pytest.raises(ValueError):
+        decode_records(frame((1, 0.0, watts)))
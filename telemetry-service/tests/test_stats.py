@@ -0,0 +1,136 @@
+import asyncio
+import random
+import statistics
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import stats
+from config import settings
+from models import DeviceStatsCheckpoint
+from stats import DeviceRollingStats, StatsRegistry
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def feed(device_stats: DeviceRollingStats, values, alpha: float = 0.1):
+    for i, value in enumerate(values):
+        device_stats.update(value, START + timedelta(seconds=i), alpha)
+
+
+def test_mean_and_variance_match_statistics():
+    values = [random.Random(7).uniform(0, 5000) for _ in range(500)]
+    device_stats = DeviceRollingStats(window_size=60)
+    feed(device_stats, values)
+
+    assert device_stats.count == len(values)
+    assert device_stats.values[stats.MEAN] == pytest.approx(statistics.fmean(values))
+    assert device_stats.variance == pytest.approx(statistics.variance(values))
+    assert device_stats.values[stats.LAST_VALUE] == values[-1]
+    assert device_stats.values[stats.LAST_SEEN] == (START + timedelta(seconds=len(values) - 1)).timestamp()
+
+
+def test_ewma():
+    device_stats = DeviceRollingStats(window_size=60)
+    feed(device_stats, [100.0, 200.0, 300.0], alpha=0.5)
+    assert device_stats.values[stats.EWMA] == pytest.approx(225.0)
+
+
+def test_rolling_min_max_cover_only_the_window():
+    values = [random.Random(11).uniform(0, 100) for _ in range(300)]
+    device_stats = DeviceRollingStats(window_size=20)
+    for i, value in enumerate(values):
+        device_stats.update(value, START + timedelta(seconds=i), 0.1)
+        window = values[max(0, i - 19):i + 1]
+        assert device_stats.window_min == min(window)
+        assert device_stats.window_max == max(window)
+
+
+def test_zscore_is_scored_against_history():
+    device_stats = DeviceRollingStats(window_size=60)
+    feed(device_stats, [100.0, 110.0] * 20)
+    history_std = statistics.stdev([100.0, 110.0] * 20)
+
+    device_stats.update(1000.0, START + timedelta(hours=1), 0.1)
+    assert device_stats.values[stats.LAST_ZSCORE] == pytest.approx((1000.0 - 105.0) / history_std)
+    assert device_stats.is_anomaly(settings.ANOMALY_SIGMA)
+
+
+def test_no_anomaly_before_min_samples():
+    device_stats = DeviceRollingStats(window_size=60)
+    feed(device_stats, [100.0, 110.0] * 5)
+    device_stats.update(1000.0, START + timedelta(hours=1), 0.1)
+    assert device_stats.count <= settings.ANOMALY_MIN_SAMPLES
+    assert not device_stats.is_anomaly(settings.ANOMALY_SIGMA)
+
+
+def test_checkpoint_round_trip():
+    device_id = uuid.uuid4()
+    device_stats = DeviceRollingStats(window_size=60)
+    feed(device_stats, [random.Random(3).uniform(0, 100) for _ in range(100)])
+
+    checkpoint = DeviceStatsCheckpoint(**device_stats.to_checkpoint(device_id))
+    restored = DeviceRollingStats.from_checkpoint(checkpoint, window_size=60)
+
+    assert list(restored.values) == pytest.approx(list(device_stats.values))
+    assert restored.window_min == device_stats.window_min
+    assert restored.window_max == device_stats.window_max
+
+
+def test_checkpoint_of_empty_stats_has_no_last_value():
+    checkpoint = DeviceRollingStats(window_size=60).to_checkpoint(uuid.uuid4())
+    assert checkpoint["last_value"] is None
+    assert checkpoint["window_min"] is None
+
+
+class RecordingSession:
+    def __init__(self, executed, fail=False):
+        self.executed = executed
+        self.fail = fail
+
+    def __call__(self, engine):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def execute(self, stmt):
+        if self.fail:
+            raise RuntimeError("connection lost")
+        self.executed.append(stmt)
+
+    async def commit(self):
+        pass
+
+
+def make_registry(device_count: int) -> StatsRegistry:
+    registry = StatsRegistry()
+    for _ in range(device_count):
+        registry.update(uuid.uuid4(), 100.0, START)
+    return registry
+
+
+def test_checkpoint_stays_under_the_bind_parameter_limit(monkeypatch):
+    executed = []
+    monkeypatch.setattr(stats, "AsyncSession", RecordingSession(executed))
+    registry = make_registry(stats.MAX_CHECKPOINTS_PER_INSERT * 2 + 1)
+
+    asyncio.run(registry.checkpoint())
+
+    assert len(executed) == 3
+    for stmt in executed:
+        assert len(stmt.compile().params) <= 32767
+    assert not registry._dirty
+
+
+def test_failed_checkpoint_is_retried(monkeypatch):
+    monkeypatch.setattr(stats, "AsyncSession", RecordingSession([], fail=True))
+    registry = make_registry(5)
+    dirty = set(registry._dirty)
+
+    asyncio.run(registry.checkpoint())
+    assert registry._dirty == dirty
@@ -0,0 +1,189 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from models import TariffRatePeriod, TariffSchedule
+from tariffs import (
+    CostCache, bucket_offset_minutes, build_rate_table, compute_costs, mask_to_weekdays, weekdays_to_mask,
+)
+
+FRIDGE = uuid.UUID("00000000-0000-0000-0000-000000000001")
+HEATER = uuid.UUID("00000000-0000-0000-0000-000000000002")
+
+# 2025-01-06 is a Monday
+MONDAY = datetime(2025, 1, 6, tzinfo=timezone.utc)
+
+SCHEDULE = TariffSchedule(
+    default_price_per_kwh=0.20,
+    rates=[
+        TariffRatePeriod(name="night", start_hour=22, end_hour=6, price_per_kwh=0.10),
+        TariffRatePeriod(name="peak", weekdays=[0, 1, 2, 3, 4], start_hour=17, end_hour=20, price_per_kwh=0.40),
+    ],
+)
+
+
+def hours(start: datetime, count: int):
+    return [start + timedelta(hours=h) for h in range(count)]
+
+
+def test_weekday_mask_round_trip():
+    assert weekdays_to_mask([0, 6, 6]) == 0b1000001
+    assert mask_to_weekdays(weekdays_to_mask([4, 1, 2])) == [1, 2, 4]
+
+
+def test_rate_table_wraps_past_midnight():
+    prices, period_index, periods = build_rate_table(SCHEDULE)
+    assert periods == ["default", "night", "peak"]
+    assert list(prices[0, [21, 22, 23, 0, 5, 6]]) == [0.20, 0.10, 0.10, 0.10, 0.10, 0.20]
+    assert list(period_index[0, [17, 19, 20]]) == [2, 2, 0]
+    # Peak only applies on weekdays
+    assert prices[5, 18] == 0.20
+
+
+def test_later_rates_override_earlier_ones():
+    schedule = TariffSchedule(
+        default_price_per_kwh=0.20,
+        rates=[
+            TariffRatePeriod(name="day", start_hour=8, end_hour=20, price_per_kwh=0.30),
+            TariffRatePeriod(name="lunch", start_hour=12, end_hour=14, price_per_kwh=0.05),
+        ],
+    )
+    prices, _, _ = build_rate_table(schedule)
+    assert list(prices[2, [11, 12, 13, 14]]) == [0.30, 0.05, 0.05, 0.30]
+
+
+def test_costs_per_device_and_period():
+    start = MONDAY + timedelta(hours=16)
+    rows = [(FRIDGE, "Fridge", bucket, 1000.0) for bucket in hours(start, 8)]
+    rows.append((HEATER, "Heater", start, 2000.0))
+
+    cost = compute_costs(rows, SCHEDULE, start, start + timedelta(hours=8))
+
+    # Fridge: 16h and 20-21h default, 17-19h peak, 22-23h night; heater: 16h default
+    assert cost.total_kwh == pytest.approx(10.0)
+    by_device = {d.device_id: d for d in cost.devices}
+    assert by_device[FRIDGE].cost == pytest.approx(3 * 0.20 + 3 * 0.40 + 2 * 0.10)
+    assert by_device[HEATER].cost == pytest.approx(2 * 0.20)
+    by_period = {p.name: p for p in cost.periods}
+    assert by_period["peak"].total_kwh == pytest.approx(3.0)
+    assert by_period["night"].cost == pytest.approx(0.20)
+    assert cost.total_cost == pytest.approx(sum(d.cost for d in cost.devices))
+
+
+def test_rates_use_the_local_time_zone():
+    schedule = SCHEDULE.model_copy(update={"timezone": "America/New_York"})
+    # 22:00 UTC is 17:00 in New York, in the peak period
+    bucket = MONDAY + timedelta(hours=22)
+    cost = compute_costs([(FRIDGE, "Fridge", bucket, 1000.0)], schedule, bucket, bucket + timedelta(hours=1))
+    assert cost.total_cost == pytest.approx(0.40)
+
+
+def test_dst_change_prices_each_hour_once():
+    schedule = SCHEDULE.model_copy(update={"timezone": "Europe/Berlin"})
+    # Clocks go back at 01:00 UTC on 2025-10-26; 00:00 and 01:00 UTC are both 02:00 local (night)
+    start = datetime(2025, 10, 25, 23, tzinfo=timezone.utc)
+    rows = [(FRIDGE, "Fridge", bucket, 1000.0) for bucket in hours(start, 4)]
+    cost = compute_costs(rows, schedule, start, start + timedelta(hours=4))
+    assert cost.total_kwh == pytest.approx(4.0)
+    assert cost.total_cost == pytest.approx(4 * 0.10)
+
+
+def test_partial_edge_hours_are_weighted_by_coverage():
+    start = MONDAY + timedelta(hours=10, minutes=45)
+    end = MONDAY + timedelta(hours=12, minutes=30)
+    rows = [(FRIDGE, "Fridge", bucket, 1000.0) for bucket in hours(MONDAY + timedelta(hours=10), 3)]
+
+    cost = compute_costs(rows, SCHEDULE, start, end)
+    assert cost.total_kwh == pytest.approx(0.25 + 1.0 + 0.5)
+    assert cost.total_cost == pytest.approx(1.75 * 0.20)
+
+
+def test_range_within_one_hour():
+    start = MONDAY + timedelta(hours=10, minutes=10)
+    cost = compute_costs(
+        [(FRIDGE, "Fridge", MONDAY + timedelta(hours=10), 1200.0)], SCHEDULE, start, start + timedelta(minutes=30)
+    )
+    assert cost.total_kwh == pytest.approx(0.6)
+
+
+def test_no_readings():
+    cost = compute_costs([], SCHEDULE, MONDAY, MONDAY + timedelta(days=1))
+    assert cost.total_kwh == 0
+    assert cost.devices == []
+
+
+def test_cost_cache_only_keeps_closed_periods():
+    cache = CostCache(max_entries=10, settle_seconds=3600)
+    version = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    cost = compute_costs([], SCHEDULE, MONDAY, MONDAY + timedelta(days=1))
+
+    cache.store(1, MONDAY, MONDAY + timedelta(days=1), version, cost)
+    assert cache.get(1, MONDAY, MONDAY + timedelta(days=1), version) is cost
+
+    now = datetime.now(timezone.utc)
+    cache.store(1, now - timedelta(hours=1), now, version, cost)
+    assert cache.get(1, now - timedelta(hours=1), now, version) is None
+
+
+def test_cost_cache_is_tied_to_the_tariff_version():
+    cache = CostCache(max_entries=10, settle_seconds=0)
+    version = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    cost = compute_costs([], SCHEDULE, MONDAY, MONDAY + timedelta(days=1))
+    cache.store(1, MONDAY, MONDAY + timedelta(days=1), version, cost)
+    assert cache.get(1, MONDAY, MONDAY + timedelta(days=1), version + timedelta(seconds=1)) is None
+
+
+def test_cost_cache_evicts_least_recently_used():
+    cache = CostCache(max_entries=2, settle_seconds=0)
+    version = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    cost = compute_costs([], SCHEDULE, MONDAY, MONDAY + timedelta(days=1))
+    days = [MONDAY + timedelta(days=d) for d in range(3)]
+
+    cache.store(1, days[0], days[1], version, cost)
+    cache.store(1, days[1], days[2], version, cost)
+    cache.get(1, days[0], days[1], version)
+    cache.store(2, days[0], days[1], version, cost)
+
+    assert cache.get(1, days[0], days[1], version) is cost
+    assert cache.get(1, days[1], days[2], version) is None
+
+    cache.invalidate_user(1)
+    assert cache.get(1, days[0], days[1], version) is None
+    assert cache.get(2, days[0], days[1], version) is cost
+
+
+@pytest.mark.parametrize("tz, minutes", [
+    ("UTC", 0),
+    ("America/New_York", 0),
+    ("Asia/Kolkata", 30),
+    ("Australia/Adelaide", 30),
+    ("America/St_Johns", 30),
+    ("Asia/Kathmandu", 45),
+])
+def test_bucket_offset_minutes(tz, minutes):
+    assert bucket_offset_minutes(tz, MONDAY) == minutes
+
+
+def test_half_hour_zone_buckets_are_priced_by_their_local_hour():
+    schedule = SCHEDULE.model_copy(update={"timezone": "Asia/Kolkata"})
+    # Buckets offset by 30 minutes: 11:30 UTC is 17:00 IST, the first peak hour; 14:30 UTC is 20:00, off peak
+    first = MONDAY + timedelta(hours=11, minutes=bucket_offset_minutes("Asia/Kolkata", MONDAY))
+    rows = [(FRIDGE, "Fridge", bucket, 1000.0) for bucket in hours(first, 4)]
+
+    cost = compute_costs(rows, schedule, first, first + timedelta(hours=4))
+    assert cost.total_cost == pytest.approx(3 * 0.40 + 0.20)
+    assert {p.name: p.total_kwh for p in cost.periods}["peak"] == pytest.approx(3.0)
+
+
+def test_half_hour_zone_range_on_a_utc_hour():
+    schedule = SCHEDULE.model_copy(update={"timezone": "Asia/Kolkata"})
+    # 11:00-12:00 UTC is 16:30-17:30 IST: half at the default price, half at peak
+    start = MONDAY + timedelta(hours=11)
+    rows = [
+        (FRIDGE, "Fridge", MONDAY + timedelta(hours=10, minutes=30), 1000.0),
+        (FRIDGE, "Fridge", MONDAY + timedelta(hours=11, minutes=30), 1000.0),
+    ]
+    cost = compute_costs(rows, schedule, start, start + timedelta(hours=1))
+    assert cost.total_kwh == pytest.approx(1.0)
+    assert cost.total_cost == pytest.approx(0.5 * 0.20 + 0.5 * 0.40)
@@ -0,0 +1,75 @@
+import json
+import re
+import secrets
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+# W3C trace context: version-trace_id-parent_span_id-flags
+TRACEPARENT_PATTERN = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-[0-9a-f]{16}-[0-9a-f]{2}$")
+
+_current_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("current_timings", default=None)
+
+
+@contextmanager
+def span(name: str):
+    """Time a stage of the current request; reported in its Server-Timing header and log event."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = _current_timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + (time.perf_counter() - started) * 1000
+
+
+class TracingMiddleware:
+    """
+    Plain ASGI middleware (no per-request task, unlike BaseHTTPMiddleware) that joins the caller's
+    trace id from the traceparent header and returns the stage timings as a Server-Timing header.
+    One structured event is logged for each traced request and for untraced ones slower than
+    `log_slower_than_ms`, so high-rate device ingest doesn't flood the log.
+    """
+
+    def __init__(self, app, log_slower_than_ms: float = 500.0):
+        self.app = app
+        self.log_slower_than_ms = log_slower_than_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = dict(scope["headers"]).get(b"traceparent", b"").decode("latin-1")
+        match = TRACEPARENT_PATTERN.match(traceparent)
+        trace_id = match.group(1) if match else secrets.token_hex(16)
+        timings: Dict[str, float] = {}
+        token = _current_timings.set(timings)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timings(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                timings["total"] = (time.perf_counter() - started) * 1000
+                server_timing = ", ".join(f"{name};dur={ms:.1f}" for name, ms in timings.items())
+                message["headers"] = [*message.get("headers", []), (b"server-timing", server_timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timings)
+        finally:
+            _current_timings.reset(token)
+            # Total including the streamed body, unlike the Server-Timing total sent with the headers
+            timings["total"] = (time.perf_counter() - started) * 1000
+            if match is not None or timings["total"] >= self.log_slower_than_ms:
+                print(json.dumps({
+                    "event": "request",
+                    "trace_id": trace_id,
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status_code": status_code,
+                    "timings_ms": {name: round(ms, 2) for name, ms in timings.items()},
+                }))